@@ -0,0 +1,158 @@
+"""
+Find the clues a game does not need. A clue is redundant iff removing it
+lets in no new solution, i.e. iff no world is rejected by that clue alone.
+
+Rather than solving once per clue with that clue left out, one search
+serves every leave-one-out variant: kinds are assigned as in the backtrack
+engine and each clue is checked as soon as the kinds it reads are assigned,
+but a partial world is only abandoned once two different clues reject it.
+Every full world reached is then a solution or rejected by exactly one
+clue, which is then known to be needed: that world is its witness. Worlds
+rejected by a clue already known to be needed are pruned as well.
+
+A minimal sufficient subset is then built greedily: drop one redundant
+clue (the most complex), analyze the rest again, and repeat until every
+remaining clue is needed. Run this module on game files:
+
+    python src/analyze.py src/games/valentine.json
+"""
+from __future__ import annotations
+import argparse
+from pathlib import Path
+from typing import Callable, Iterable
+from thing import Thing
+from game import Game, Clue
+import backtrack
+import solve
+
+# A world: a row per Thing of the first kind, each row a Thing per kind
+World = list[list[Thing]]
+
+def plan_clues(g: Game, clues: list[Clue]) -> list[list[tuple[int, Callable[[], bool]]]]:
+    """
+    Return, for each kind in assignment order, the number of each clue with
+    rules that become evaluable once that kind is assigned, and their check.
+    """
+    levels = []
+    for level in range(len(g.sets)):
+        checks = []
+        for (i, clue) in enumerate(clues):
+            rules = list(r for r in clue.rules if max(r.get_kinds(), default=0) == level)
+            if rules:
+                checks.append((i, backtrack.get_check(g, rules)))
+        levels.append(checks)
+    return levels
+
+def find_witnesses(g: Game, clues: list[Clue], known: Iterable[int] = ()) -> tuple[int, dict[int, World]]:
+    """
+    Return the number of worlds satisfying every clue, and for each clue that
+    is needed, a world that it alone rejects. Clues whose number is known to
+    be needed are not looked into, and neither is any clue once it has its
+    witness, so the worlds only they reject are pruned.
+    """
+    first, *groups = list(g.sets.values())
+    levels = plan_clues(g, clues)
+    rows = [[t] for t in first]
+    solutions, witnesses = 0, {}
+    known = set(known)
+
+    def _check(depth: int, failed: int|None) -> tuple[bool, int|None]:
+        """Check the clues of a level. Return whether to go on, and which clue fails if any."""
+        for (i, check) in levels[depth]:
+            if i != failed and not check():
+                if failed is not None or i in known or i in witnesses:
+                    return False, None
+                failed = i
+        return True, failed
+
+    def _search(depth: int, failed: int|None) -> None:
+        nonlocal solutions
+
+        if failed in witnesses:
+            return
+
+        if depth == len(levels):
+            if failed is None:
+                solutions += 1
+            else:
+                witnesses[failed] = [row[:] for row in rows]
+            return
+
+        for perm in solve.get_permutations(groups[depth - 1], rows, depth, None):
+            backtrack.link_kind(rows, perm)
+            (go, now_failed) = _check(depth, failed)
+            if go:
+                _search(depth + 1, now_failed)
+            backtrack.unlink_kind(rows)
+
+    g.reset_relationships()
+    try:
+        (go, failed) = _check(0, None)
+        if go:
+            _search(1, failed)
+    finally:
+        g.reset_relationships()
+
+    return solutions, witnesses
+
+def minimize(g: Game, needed: Iterable[Clue] = ()) -> list[Clue]:
+    """
+    A subset of the clues with the same solutions, from which no clue can be
+    left out. Leaving out clues only lets in more worlds, so a clue that is
+    needed stays needed and is not looked into again.
+    """
+    clues = g.clues[:]
+    needed = set(needed)
+    while True:
+        known = list(i for (i, clue) in enumerate(clues) if clue in needed)
+        (_, witnesses) = find_witnesses(g, clues, known)
+        needed |= set(clues[i] for i in witnesses)
+
+        redundant = list(clue for clue in clues if clue not in needed)
+        if not redundant:
+            return clues
+        clues.remove(max(redundant, key=lambda c: c.get_complexity()))
+
+def analyze(g: Game) -> dict[str, object]:
+    """
+    Report, for each clue in file order, whether it is needed and if so a
+    world that only it rejects, and the clues of a minimal sufficient subset.
+    The Game must not be pre-solved: the grid would skip worlds that only
+    the clue being left out rejects.
+    """
+    if g.grid is not None:
+        raise ValueError('Analyze the clues before pre-solving the game')
+
+    (solutions, witnesses) = find_witnesses(g, g.clues)
+    minimal = minimize(g, list(g.clues[i] for i in witnesses))
+
+    return {
+        'solutions': solutions,
+        'clues': list({
+            'number': i + 1,
+            'clue': str(clue).replace('\n', ' & '),
+            'redundant': i not in witnesses,
+            'witness': list(list(t.id for t in row) for row in witnesses[i]) if i in witnesses else None,
+            'minimal': clue in minimal,
+        } for (i, clue) in enumerate(g.clues)),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Find redundant clues and a minimal sufficient subset.')
+    parser.add_argument('paths', nargs='+', type=Path, help='game files')
+    args = parser.parse_args()
+
+    for path in args.paths:
+        g = Game.parse_json(path)
+        g.compile_clues()
+        report = analyze(g)
+
+        print(f'{path.stem}: {report["solutions"]} solution(s)')
+        for c in report['clues']:
+            status = 'redundant' if c['redundant'] else 'needed'
+            print(f'  {c["number"]:>3} {"*" if c["minimal"] else " "} {status:9} {c["clue"]}')
+        kept = list(c['number'] for c in report['clues'] if c['minimal'])
+        print(f'  Minimal subset (*): {len(kept)} of {len(report["clues"])} clues: {", ".join(map(str, kept))}\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+A backtracking engine. Instead of building every full world and only then
+checking the clues, kinds are assigned one at a time (each as a permutation
+against the first kind, just like get_all_worlds), and every Rule is
+evaluated as soon as all the kinds it reads have been assigned. A failing
+Rule prunes every world below that point. If the Game's clues are compiled,
+the rules of each step are compiled together into one check.
+
+Solutions are yielded in the same order and format as the brute force engine.
+"""
+from __future__ import annotations
+from typing import Callable, Iterator
+from thing import Thing
+from game import Game, Rule
+import compiler
+import solve
+
+def plan_rules(g: Game) -> list[list[Rule]]:
+    """
+    Return, for each kind in assignment order, the Rules that become
+    evaluable once that kind is assigned. The rules in a Clue are joined
+    by an implicit and, so each one can be placed independently.
+    """
+    levels = [[] for _ in g.sets]
+
+    for clue in g.clues:
+        for rule in clue.rules:
+            level = max(rule.get_kinds(), default=0)
+            levels[level].append(rule)
+
+    return levels
+
+def get_check(g: Game, rules: list[Rule]) -> Callable[[], bool]:
+    """
+    Return a check of the rules: compiled if the Game's clues are compiled,
+    and otherwise evaluated one by one (e.g. while profiling).
+    """
+    if g.checker is not None:
+        return compiler.compile_rules(g, rules)
+    return lambda: all(r.evaluate(g) for r in rules)
+
+def link_kind(rows: list[list[Thing]], perm: tuple[Thing]) -> None:
+    """Append one Thing to each row and relate it to the rest of the row."""
+    for (row, t) in zip(rows, perm):
+        for other in row:
+            other.set(t.kind_index, t)
+            t.set(other.kind_index, other)
+        row.append(t)
+
+def unlink_kind(rows: list[list[Thing]]) -> None:
+    """Undo the last link_kind."""
+    for row in rows:
+        t = row.pop()
+        t.reset_relationships()
+        for other in row:
+            other.unset(t.kind_index)
+
+def iter_solutions(g: Game) -> Iterator[list[list[Thing]]]:
+    first, *groups = list(g.sets.values())
+    levels = list(get_check(g, rules) for rules in plan_rules(g))
+    rows = [[t] for t in first]
+
+    g.reset_relationships()
+
+    try:
+        if levels[0]():
+            yield from _search(g, rows, groups, levels, 1)
+
+    finally:
+        g.reset_relationships()
+
+def _search(g: Game, rows: list[list[Thing]], groups: list[list[Thing]],
+            levels: list[Callable[[], bool]], depth: int) -> Iterator[list[list[Thing]]]:
+
+    if depth == len(levels):
+        yield [row[:] for row in rows]
+        return
+
+    check = levels[depth]
+    for perm in solve.get_permutations(groups[depth - 1], rows, depth, g.grid):
+        link_kind(rows, perm)
+
+        if check():
+            yield from _search(g, rows, groups, levels, depth + 1)
+
+        unlink_kind(rows)
@@ -0,0 +1,114 @@
+"""
+Solve many games without any interaction. Games are given as files or
+directories of game files, solved in a process pool (the biggest estimated
+search space first, so that the longest job does not start last), and the
+results are streamed as JSON lines, one per game, as soon as each finishes:
+
+    python src/batch.py src/games/ --processes 4 > results.jsonl
+
+Neither tabulate nor progressbar is imported in this mode, and each game
+is loaded from its snapshot (see snapshot.py) once it has been prepared.
+"""
+from __future__ import annotations
+import argparse
+import concurrent.futures
+import json
+import sys
+import time
+from pathlib import Path
+from game import Game
+import snapshot
+import solve
+
+def get_paths(paths: list[Path]) -> list[Path]:
+    """Expand directories into the game files they contain."""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(path.glob('*.json')))
+        else:
+            files.append(path)
+    return files
+
+def estimate_worlds(g: Game) -> int:
+    """
+    Estimate the search space: the permutations of each kind allowed against
+    the first kind by the pre-solved grid, multiplied together.
+    """
+    if g.grid is None:
+        return solve.count_worlds(g)
+
+    first, *groups = list(g.sets.values())
+    estimate = 1
+    for (k, group) in enumerate(groups, 1):
+        masks = list(sum(1 << i for (i, t) in enumerate(group) if t in g.grid.domains[f][k]) for f in first)
+        estimate *= sum(1 for _ in solve.permutations(group, masks))
+    return estimate
+
+def solve_path(path: Path, engine: str, limit: int|None) -> dict[str, object]:
+    start = time.perf_counter()
+    g = snapshot.load_game(path)
+    prepared = time.perf_counter()
+
+    solutions = solve.find_solutions(g, limit, engine, progress=False)
+    end = time.perf_counter()
+
+    return {
+        'solutions': list(list(list(t.id for t in row) for row in world) for world in solutions),
+        'count': len(solutions),
+        'prepare_seconds': prepared - start,
+        'solve_seconds': end - prepared,
+    }
+
+def schedule(paths: list[Path]) -> list[tuple[Path, int|None]]:
+    """
+    Return the paths with their estimated search space, biggest first.
+    Games that cannot be parsed are estimated as None and go last.
+    This also takes the snapshots that the workers then load.
+    """
+    estimates = []
+    for path in paths:
+        try:
+            g = snapshot.load_game(path)
+            estimates.append((path, estimate_worlds(g)))
+        except (OSError, ValueError, KeyError):
+            estimates.append((path, None))
+
+    return sorted(estimates, key=lambda e: -1 if e[1] is None else e[1], reverse=True)
+
+def run(paths: list[Path], engine: str = 'backtrack', processes: int|None = None, limit: int|None = None) -> None:
+    """Solve every game, printing a JSON line for each as soon as it is done."""
+    start = time.perf_counter()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {}
+        for (path, worlds) in schedule(paths):
+            futures[pool.submit(solve_path, path, engine, limit)] = (path, worlds)
+
+        for future in concurrent.futures.as_completed(futures):
+            path, worlds = futures[future]
+            result = {'game': path.stem, 'path': str(path), 'engine': engine, 'estimated_worlds': worlds}
+            try:
+                result.update(future.result())
+            except Exception as e:
+                result['error'] = f'{type(e).__name__}: {e}'
+            result['elapsed_seconds'] = time.perf_counter() - start
+
+            print(json.dumps(result), flush=True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Solve games non-interactively, printing JSON lines.')
+    parser.add_argument('paths', nargs='+', type=Path, help='game files or directories of them')
+    parser.add_argument('--engine', default='backtrack', choices=solve.ENGINES)
+    parser.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--limit', type=int, help='stop each game after this many solutions')
+    args = parser.parse_args()
+
+    paths = get_paths(args.paths)
+    if not paths:
+        sys.exit('No game files found.')
+
+    run(paths, args.engine, args.processes, args.limit)
+
+if __name__ == '__main__':
+    main()
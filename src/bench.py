@@ -0,0 +1,290 @@
+"""
+Benchmark the solver over the bundled games and synthetic puzzles.
+
+Every game is measured phase by phase (parsing, clue optimization and
+compilation, world generation, and validation), and then solved by each
+engine. Each measurement runs in a fresh process so that its peak RSS is
+its own. Results can be saved as JSON and compared against a baseline:
+
+    python src/bench.py --output baseline.json
+    python src/bench.py --baseline baseline.json --threshold 0.2
+
+Generation and validation are timed over the first --sample worlds of a
+game, and engines that would visit more than --max-worlds are skipped.
+
+Every engine must find the same solutions as the others on every game, so
+a disagreement is reported and fails the run like a regression. The tests
+check every engine on the bundled games; this checks them on any others:
+
+    python src/bench.py my_games/*.json --engines backtrack brute sat bitset planned
+"""
+from __future__ import annotations
+import argparse
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+from thing import Thing
+from game import Game
+import solve
+
+BRUTE_ENGINES = {'brute', 'incremental', 'numpy', 'parallel'}
+
+def make_puzzle(n: int, k: int, seed: int = 0) -> dict[str, object]:
+    """
+    Generate a game with k kinds of n things and a unique solution.
+    The last kind is numeric so that sorting and adjacency rules apply.
+    Clues that hold in a hidden solution are added until it is the only one.
+    """
+    rng = random.Random(seed)
+
+    kinds = list({'name': f'K{i}', 'things': list(f'K{i}-{j}' for j in range(n))} for i in range(k - 1))
+    kinds.append({'name': 'Number', 'things': list(str(10 * (j + 1)) for j in range(n))})
+
+    # The hidden solution: row r holds things[i][hidden[i][r]] for each kind i
+    hidden = list(rng.sample(range(n), n) for _ in kinds)
+    rows = list(list(kind['things'][hidden[i][r]] for (i, kind) in enumerate(kinds)) for r in range(n))
+
+    def _rule() -> dict[str, object]:
+        r1, r2 = rng.sample(range(n), 2)
+        i, j = rng.sample(range(k), 2)
+        match rng.choice(['link', '!link', 'same', '!same', '<', 'adj']):
+            case 'link':
+                return {'func': 'link', 'args': [rows[r1][i], rows[r1][j]]}
+            case '!link':
+                return {'func': '!link', 'args': [rows[r1][i], rows[r2][j]]}
+            case 'same':
+                return {'func': 'same', 'args': [f'{rows[r1][i]}::{kinds[j]["name"]}', rows[r1][j]]}
+            case '!same':
+                return {'func': '!same', 'args': [f'{rows[r1][i]}::{kinds[j]["name"]}', rows[r2][j]]}
+            case '<' | 'adj':
+                a, b = sorted((r1, r2), key=lambda r: int(rows[r][-1]))
+                func = 'adj' if abs(int(rows[a][-1]) - int(rows[b][-1])) == 10 else '<'
+                return {'func': func, 'args': [f'{rows[a][i]}::Number', f'{rows[b][j]}::Number']}
+
+    # Start from about as many clues as a hand-made puzzle, then add them in batches
+    data = {'kinds': kinds, 'clues': list([_rule()] for _ in range(n * k))}
+    while True:
+        g = Game.parse_data(data)
+        if len(solve.find_solutions(g, limit=2, engine='backtrack')) == 1:
+            return data
+        data['clues'].extend([_rule()] for _ in range(n))
+
+def get_cases(paths: list[Path], sizes: list[str]) -> dict[str, dict[str, object]]:
+    cases = {}
+    for path in paths:
+        with open(path, 'r') as f:
+            cases[path.stem] = json.loads(f.read())
+
+    for size in sizes:
+        n, k = (int(x) for x in size.split('x'))
+        cases[f'synthetic-{n}x{k}'] = make_puzzle(n, k)
+
+    return cases
+
+def get_peak_rss() -> int:
+    """Peak resident set size of this process in KiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measure_phases(data: dict[str, object], sample: int) -> dict[str, object]:
+    start = time.perf_counter()
+    g = Game.parse_data(data)
+    parse = time.perf_counter() - start
+
+    start = time.perf_counter()
+    g.optimize_clues()
+    optimize = time.perf_counter() - start
+
+    start = time.perf_counter()
+    g.compile_clues()
+    compile = time.perf_counter() - start
+    g.checker = None
+
+    n = min(sample, solve.count_worlds(g))
+
+    start = time.perf_counter()
+    for _ in itertools.islice(solve.get_all_worlds(g), n):
+        pass
+    generate = time.perf_counter() - start
+
+    # Validate with the interpreted clues, counting how many are evaluated
+    evaluations = 0
+    g.reset_relationships()
+    start = time.perf_counter()
+    for world in itertools.islice(solve.get_all_worlds(g), n):
+        solve.realize_world(world)
+        for clue in g.clues:
+            evaluations += 1
+            if not clue.validate(g):
+                break
+        g.reset_relationships()
+    validate = time.perf_counter() - start
+
+    return {
+        'worlds': solve.count_worlds(g),
+        'sampled_worlds': n,
+        'parse_seconds': parse,
+        'optimize_seconds': optimize,
+        'compile_seconds': compile,
+        'generate_seconds': generate,
+        'generate_worlds_per_second': n / generate if generate else None,
+        'validate_seconds': validate,
+        'validate_worlds_per_second': n / validate if validate else None,
+        'clue_evaluations_per_world': evaluations / n if n else None,
+        'peak_rss_kib': get_peak_rss(),
+    }
+
+def get_fingerprint(solutions: list[list[list[Thing]]]) -> str:
+    """
+    A digest of the set of solutions, regardless of the order they were found
+    in. Kinds with more things than rows may repeat a world (see
+    solve.permutations), so repeats are ignored too.
+    """
+    worlds = sorted(set(tuple(tuple(t.id for t in row) for row in world) for world in solutions))
+    return hashlib.sha256(json.dumps(worlds).encode()).hexdigest()[:16]
+
+def measure_engine(data: dict[str, object], engine: str) -> dict[str, object]:
+    g = Game.parse_data(data)
+    g.optimize_clues()
+    g.compile_clues()
+    try:
+        solve.check_engine(g, engine)
+    except ValueError as e:
+        return {'skipped': str(e)}
+
+    start = time.perf_counter()
+    try:
+        # Drawing a progress bar would be timed too
+        solutions = solve.find_solutions(g, engine=engine, progress=False)
+    except ImportError as e:
+        return {'skipped': str(e)}
+    seconds = time.perf_counter() - start
+
+    return {
+        'seconds': seconds,
+        'solutions': len(solutions),
+        'fingerprint': get_fingerprint(solutions),
+        'worlds_per_second': solve.count_worlds(g) / seconds if engine in BRUTE_ENGINES and seconds else None,
+        'peak_rss_kib': get_peak_rss(),
+    }
+
+def run(cases: dict[str, dict[str, object]], engines: list[str], sample: int, max_worlds: int) -> dict[str, object]:
+    """Measure every case, each phase and engine in a fresh process."""
+    results = {}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+        for (name, data) in cases.items():
+            print(f'{name}...', file=sys.stderr)
+            result = pool.submit(measure_phases, data, sample).result()
+            result['engines'] = {}
+
+            for engine in engines:
+                if engine in BRUTE_ENGINES and result['worlds'] > max_worlds:
+                    result['engines'][engine] = {'skipped': f'more than {max_worlds} worlds'}
+                    continue
+                result['engines'][engine] = pool.submit(measure_engine, data, engine).result()
+
+            results[name] = result
+
+    return results
+
+def get_timings(results: dict[str, object]) -> dict[str, float]:
+    """Flatten the results into the timings that are compared against a baseline."""
+    timings = {}
+    for (name, result) in results.items():
+        for phase in ('parse', 'optimize', 'compile', 'generate', 'validate'):
+            timings[f'{name} {phase}'] = result[f'{phase}_seconds']
+        for (engine, measured) in result['engines'].items():
+            if 'seconds' in measured:
+                timings[f'{name} {engine}'] = measured['seconds']
+    return timings
+
+def compare(results: dict[str, object], baseline: dict[str, object], threshold: float, noise: float) -> list[str]:
+    """
+    Return a line for each timing that is slower than the baseline by more than
+    the threshold (a fraction) and by more than noise seconds.
+    """
+    regressions = []
+    old, new = get_timings(baseline), get_timings(results)
+    for (key, seconds) in new.items():
+        if key in old and seconds > old[key] * (1 + threshold) and seconds - old[key] > noise:
+            regressions.append(f'{key}: {old[key]:.4f}s -> {seconds:.4f}s (+{seconds / old[key] - 1:.0%})')
+    return regressions
+
+def check_agreement(results: dict[str, object]) -> list[str]:
+    """Return a line for each engine that found other solutions than the first engine measured on the same game."""
+    disagreements = []
+    for (name, result) in results.items():
+        measured = list((engine, e) for (engine, e) in result['engines'].items() if 'fingerprint' in e)
+        for (engine, e) in measured[1:]:
+            (reference, r) = measured[0]
+            if e['fingerprint'] != r['fingerprint']:
+                disagreements.append(f'{name}: {engine} found {e["solutions"]} solution(s), {reference} {r["solutions"]}, and they differ')
+    return disagreements
+
+def print_results(results: dict[str, object]) -> None:
+    def _fmt(x: float|None, width: int, spec: str) -> str:
+        return f'{"-" if x is None else format(x, spec):>{width}}'
+
+    print(f'{"game":20} {"worlds":>14} {"parse ms":>9} {"worlds/s gen":>13} {"worlds/s val":>13} {"clues/world":>12} {"RSS MiB":>8}')
+    for (name, r) in results.items():
+        print(f'{name:20} {r["worlds"]:>14,} {r["parse_seconds"] * 1000:>9.2f} '
+              f'{_fmt(r["generate_worlds_per_second"], 13, ",.0f")} {_fmt(r["validate_worlds_per_second"], 13, ",.0f")} '
+              f'{_fmt(r["clue_evaluations_per_world"], 12, ".2f")} {r["peak_rss_kib"] / 1024:>8.1f}')
+
+    print()
+    print(f'{"game":20} {"engine":12} {"seconds":>10} {"solutions":>10} {"worlds/s":>13} {"RSS MiB":>8}')
+    for (name, r) in results.items():
+        for (engine, e) in r['engines'].items():
+            if 'skipped' in e:
+                print(f'{name:20} {engine:12} skipped: {e["skipped"]}')
+            else:
+                print(f'{name:20} {engine:12} {e["seconds"]:>10.3f} {e["solutions"]:>10} '
+                      f'{_fmt(e["worlds_per_second"], 13, ",.0f")} {e["peak_rss_kib"] / 1024:>8.1f}')
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the solver.')
+    parser.add_argument('games', nargs='*', type=Path, help='game files (default: src/games/*.json)')
+    parser.add_argument('--engines', nargs='+', default=['incremental', 'backtrack', 'numpy'], choices=solve.ENGINES)
+    parser.add_argument('--synthetic', nargs='*', default=['4x4', '5x4', '5x5', '6x4'], metavar='NxK',
+                        help='synthetic puzzles of N things by K kinds')
+    parser.add_argument('--sample', type=int, default=20_000, help='worlds to generate and validate per game')
+    parser.add_argument('--max-worlds', type=int, default=2_000_000, help='skip brute force engines on bigger games')
+    parser.add_argument('--output', type=Path, help='save the results as JSON')
+    parser.add_argument('--baseline', type=Path, help='compare against saved results')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown against the baseline (default 0.1)')
+    parser.add_argument('--noise', type=float, default=0.01, help='ignore slowdowns of fewer seconds (default 0.01)')
+    args = parser.parse_args()
+
+    paths = args.games or sorted(Path('src/games/').glob('*.json'))
+    results = run(get_cases(paths, args.synthetic), args.engines, args.sample, args.max_worlds)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=2))
+
+    disagreements = check_agreement(results)
+    if disagreements:
+        print(f'\n{len(disagreements)} engine disagreement(s):')
+        print('\n'.join(disagreements))
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.loads(f.read()), args.threshold, args.noise)
+
+        print()
+        if regressions:
+            print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}:')
+            print('\n'.join(regressions))
+            sys.exit(1)
+        print(f'No regressions beyond {args.threshold:.0%}.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+A bitset engine. The state of the search is, for every Thing, the bitmask
+of the rows (Things of the first kind) it may still be in. Two Things are
+linked iff they share a row, so link, !link, same and !same between plain
+Things (or A::Kind and a Thing of that kind) are bitwise operations on two
+masks, and so is the rule that every kind has exactly one Thing per row.
+
+The search propagates those constraints to a fixpoint, then branches on
+an undecided Thing. Every other Rule is checked, on the realized rows, as
+soon as every Thing it reads is in a known row.
+
+Solutions are yielded in the same format as the other engines, but in the
+order this search finds them.
+"""
+from __future__ import annotations
+from typing import Callable, Iterator
+from thing import Thing
+from game import Game, Rule, Symbol
+from presolve import Grid
+import backtrack
+
+# Masks are indexed by Thing.index
+Masks = list[int]
+
+class BitsetGame:
+    g: Game
+    groups: list[list[Thing]]
+    n: int
+    full: int
+    links: list[tuple[int, int]]
+    unlinks: list[tuple[int, int]]
+    rules: list[Rule]
+    symbols: dict[Rule, list[Symbol]]
+    checks: dict[Rule, Callable[[], bool]]
+
+    def __init__(self: BitsetGame, g: Game) -> None:
+        self.g = g
+        self.groups = list(g.sets.values())
+        self.n = len(self.groups[0])
+        if any(len(group) != self.n for group in self.groups):
+            raise ValueError('The bitset engine needs every kind to have the same number of things')
+        self.full = (1 << self.n) - 1
+
+        self.links, self.unlinks, self.rules = [], [], []
+        for clue in g.clues:
+            for r in clue.rules:
+                self.add_rule(r)
+
+        self.symbols = {r: self.get_symbols(r) for r in self.rules}
+        self.checks = {r: backtrack.get_check(g, [r]) for r in self.rules}
+
+    def add_rule(self: BitsetGame, r: Rule) -> None:
+        """Turn the Rule into links and unlinks if it is a cell constraint, and otherwise keep it as a check."""
+        f, symbols = r.json['func'], r.symbols
+
+        match f:
+            case 'and':
+                for sub in r.subrules:
+                    self.add_rule(sub)
+                return
+            case 'link' if len(symbols) == 2 and Grid.is_cell(*symbols):
+                self.links.append((symbols[0].thing.index, symbols[1].thing.index))
+                return
+            case '!link' if (all(not s.path for s in symbols)
+                             and len(set(s.thing for s in symbols)) == len(symbols)):
+                # Distinct Things of the same kind are never linked
+                for (i, a) in enumerate(symbols):
+                    for b in symbols[i + 1:]:
+                        if a.thing.kind_index != b.thing.kind_index:
+                            self.unlinks.append((a.thing.index, b.thing.index))
+                return
+            case 'same' | '!same' if len(symbols) == 2:
+                for (a, b) in (symbols, symbols[::-1]):
+                    if Grid.is_kind_of(a, b):
+                        pairs = self.links if f == 'same' else self.unlinks
+                        pairs.append((a.thing.index, b.thing.index))
+                        return
+
+        self.rules.append(r)
+
+    @staticmethod
+    def get_symbols(r: Rule) -> list[Symbol]:
+        """Every Symbol in the Rule and its subrules."""
+        return r.symbols + list(s for sub in r.subrules for s in BitsetGame.get_symbols(sub))
+
+    def get_initial(self: BitsetGame) -> Masks:
+        masks = [self.full] * sum(len(group) for group in self.groups)
+        for (r, t) in enumerate(self.groups[0]):
+            masks[t.index] = 1 << r
+        return masks
+
+    def propagate(self: BitsetGame, masks: Masks) -> bool:
+        """Narrow the masks until nothing changes. Return False on a contradiction."""
+        changed = True
+        while changed:
+            changed = False
+
+            for (a, b) in self.links:
+                both = masks[a] & masks[b]
+                if not both:
+                    return False
+                if masks[a] != both or masks[b] != both:
+                    masks[a] = masks[b] = both
+                    changed = True
+
+            for (a, b) in self.unlinks:
+                for (x, y) in ((a, b), (b, a)):
+                    # A Thing in a known row keeps the other out of it
+                    if masks[x] & (masks[x] - 1) == 0 and masks[y] & masks[x]:
+                        masks[y] &= ~masks[x]
+                        if not masks[y]:
+                            return False
+                        changed = True
+
+            for group in self.groups[1:]:
+                # Each row has exactly one Thing of the kind
+                decided, seen, twice = 0, 0, 0
+                for t in group:
+                    m = masks[t.index]
+                    if m & (m - 1) == 0:
+                        if m & decided:
+                            return False
+                        decided |= m
+                    twice |= seen & m
+                    seen |= m
+                if seen != self.full:
+                    return False
+
+                # Rows only one Thing can be in
+                once = seen & ~twice
+                for t in group:
+                    m = masks[t.index]
+                    if m & (m - 1) == 0:
+                        continue
+                    narrowed = m & ~decided
+                    if narrowed & once:
+                        narrowed &= once
+                        if narrowed & (narrowed - 1):
+                            return False
+                    if not narrowed:
+                        return False
+                    if narrowed != m:
+                        masks[t.index] = narrowed
+                        changed = True
+
+        return True
+
+    def get_rows(self: BitsetGame, masks: Masks) -> list[list[Thing|None]]:
+        """The Thing of each kind in each row, or None where that is not known yet."""
+        rows = [[None] * len(self.groups) for _ in range(self.n)]
+        for group in self.groups:
+            for t in group:
+                m = masks[t.index]
+                if m & (m - 1) == 0:
+                    rows[m.bit_length() - 1][t.kind_index] = t
+        return rows
+
+    def relate(self: BitsetGame, rows: list[list[Thing|None]]) -> None:
+        """Relate the known Things of each row to each other."""
+        self.g.reset_relationships()
+        for row in rows:
+            things = list(t for t in row if t is not None)
+            for t in things:
+                for other in things:
+                    t.set(other.kind_index, other)
+
+    def is_known(self: BitsetGame, s: Symbol, masks: Masks, rows: list[list[Thing|None]]) -> bool:
+        """
+        Whether the Symbol's Thing and every Thing along its path are in known
+        rows. They all share the row of the first one.
+        """
+        m = masks[s.thing.index]
+        if m & (m - 1):
+            return False
+        row = rows[m.bit_length() - 1]
+        return all(row[k] is not None for k in s.path)
+
+    def search(self: BitsetGame, masks: Masks, pending: list[Rule]) -> Iterator[list[list[Thing]]]:
+        if not self.propagate(masks):
+            return
+
+        # Check each Rule as soon as every Thing it reads is in a known row
+        rows = self.get_rows(masks)
+        ready = list(r for r in pending if all(self.is_known(s, masks, rows) for s in self.symbols[r]))
+        if ready:
+            self.relate(rows)
+            if not all(self.checks[r]() for r in ready):
+                return
+            pending = list(r for r in pending if r not in ready)
+
+        undecided = list(k for (k, group) in enumerate(self.groups)
+                         if any(masks[t.index] & (masks[t.index] - 1) for t in group))
+        if not undecided:
+            yield rows
+            return
+
+        # Branch within the undecided kind with the fewest options left, so that
+        # kinds (and the rules reading them) are decided as early as possible,
+        # on its Thing with the fewest possible rows
+        def _options(k: int) -> int:
+            return sum(masks[t.index].bit_count() for t in self.groups[k])
+
+        group = self.groups[min(undecided, key=_options)]
+        i = min((t.index for t in group if masks[t.index] & (masks[t.index] - 1)),
+                key=lambda i: (masks[i].bit_count(), i))
+        options = masks[i]
+        while options:
+            bit = options & -options
+            options ^= bit
+            branch = masks[:]
+            branch[i] = bit
+            yield from self.search(branch, pending)
+
+def iter_solutions(g: Game) -> Iterator[list[list[Thing]]]:
+    bg = BitsetGame(g)
+
+    g.reset_relationships()
+    try:
+        for rows in bg.search(bg.get_initial(), bg.rules):
+            yield list(row[:] for row in rows)
+    finally:
+        g.reset_relationships()
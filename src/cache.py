@@ -0,0 +1,143 @@
+"""
+A persistent on-disk cache of solutions, keyed by a hash of the canonical
+form of a Game: its kinds and things sorted by name, and its clues with
+their rules normalized and sorted. Reordering a game file therefore still
+hits the cache, while changing any thing or clue misses it.
+
+Each entry is a solution file (see solfile) laid out in the canonical
+order and read through mmap, holding the solutions in the order they were
+found. Reading an entry marks it as recently used, and the least recently
+used entries are deleted whenever the cache grows beyond its size bound.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterable
+from thing import Thing
+from game import Game
+from solfile import SolutionFile, SolutionWriter
+
+# Bump when the canonical form or the entry format changes
+VERSION = 3
+
+DEFAULT_PATH = Path('.cache/solutions/')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Functions whose arguments can be given in any order
+SYMMETRIC = {
+    'link', '!link', 'same', '!same',
+    'and', 'or', 'xor', 'nand', 'nor', 'not', '!',
+}
+
+# Functions whose arguments can be swapped only when there are two: a chain
+# of three or more adjacent things depends on its order
+SYMMETRIC_PAIRS = {'adj', '!adj', 'adjA', '!adjA'}
+
+# A solution: a row per Thing of the first kind, each row a Thing per kind
+Solution = list[list[Thing]]
+
+def dumps(x: object) -> str:
+    return json.dumps(x, sort_keys=True, separators=(',', ':'))
+
+def normalize_rule(json_rule: dict[str, object]) -> dict[str, object]:
+    f, args = json_rule['func'], json_rule['args']
+    args = list(normalize_rule(a) if isinstance(a, dict) else str(a) for a in args)
+    if f in SYMMETRIC or (f in SYMMETRIC_PAIRS and len(args) == 2):
+        args.sort(key=dumps)
+    return {'func': f, 'args': args}
+
+def get_canonical(g: Game) -> dict[str, object]:
+    kinds = sorted([kind, sorted(t.id for t in things)] for (kind, things) in g.sets.items())
+    clues = sorted((sorted((normalize_rule(r.json) for r in clue.rules), key=dumps) for clue in g.clues), key=dumps)
+    return {'version': VERSION, 'kinds': kinds, 'clues': clues}
+
+def get_key(g: Game) -> str:
+    return hashlib.sha256(dumps(get_canonical(g)).encode()).hexdigest()
+
+def get_groups(g: Game) -> list[list[Thing]]:
+    """
+    The kinds of the Game and their Things in canonical order: the smallest
+    kinds first, as a solution file's first kind cannot have more things
+    than the others, and then by name.
+    """
+    kinds = sorted(g.sets, key=lambda kind: (len(g.sets[kind]), kind))
+    return list(sorted(g.sets[kind], key=lambda t: t.id) for kind in kinds)
+
+class SolutionCache:
+    path: Path
+    max_bytes: int
+
+    def __init__(self: SolutionCache, path: Path = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def get_entry(self: SolutionCache, key: str) -> Path:
+        return self.path / f'{key}.sol'
+
+    def get(self: SolutionCache, g: Game) -> SolutionFile|None:
+        """Return the cached solutions of the Game, or None if there are none."""
+        return self.open(get_key(g), g)
+
+    def open(self: SolutionCache, key: str, g: Game) -> SolutionFile|None:
+        """
+        Return the solutions cached under the key, in the Game's Things, or
+        None if there are none. The key may be that of another version of
+        the Game, e.g. with other clues, as long as its things are the same.
+        """
+        entry = self.get_entry(key)
+        try:
+            solutions = SolutionFile(entry, g)
+            os.utime(entry)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        return solutions
+
+    def put(self: SolutionCache, g: Game, solutions: Iterable[Solution]) -> SolutionFile:
+        """
+        Stream every solution of the Game into its entry, then evict to the
+        size bound. Return the stored solutions, which stay readable even if
+        the entry itself was evicted.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry = self.get_entry(get_key(g))
+
+        # Write to a temporary file first so that readers never see half an entry
+        temporary = entry.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            with SolutionWriter(temporary, get_groups(g)) as writer:
+                writer.write_all(solutions)
+            os.replace(temporary, entry)
+        finally:
+            temporary.unlink(missing_ok=True)
+
+        stored = SolutionFile(entry, g)
+        self.evict()
+        return stored
+
+    def evict(self: SolutionCache) -> None:
+        """Delete the least recently used entries until the cache fits its bound."""
+        entries = []
+        for entry in self.path.glob('*.sol'):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, entry) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                entry.unlink(missing_ok=True)
+            except OSError:
+                # Some platforms cannot delete a file while it is mapped
+                continue
+            total -= size
+
+    def clear(self: SolutionCache) -> None:
+        for entry in self.path.glob('*.sol'):
+            entry.unlink(missing_ok=True)
@@ -0,0 +1,249 @@
+"""
+Compile Rules into one generated Python function.
+
+Interpreted evaluation goes through Rule.evaluate, a closure, resolve_symbols
+and a ThingSort/ThingMath call for every rule in every world.
+The compiled function instead has each Symbol's resolution inlined as
+attribute lookups, each predicate specialized to its arguments (e.g. a
+chained comparison for <), and the boolean operators written out so that
+they short-circuit. It returns exactly what evaluating the same rules in
+order with Rule.evaluate would.
+
+Compiled functions read the realized world, so they take no arguments.
+The generated code is cached by its source, so parsing the same game file
+again reuses the compiled code object.
+"""
+from __future__ import annotations
+import itertools
+import time
+from types import CodeType
+from typing import Callable
+from thing import Thing, ThingSort, ThingMath
+from game import Game, Rule, Symbol
+
+_cache: dict[str, CodeType] = {}
+
+SORTS = {
+    '<': '<', '>': '>', '<=': '<=', '>=': '>=',
+    '<A': '<', '>A': '>', '<=A': '<=', '>=A': '>=',
+}
+
+# Used instead of a chained comparison where a Thing may not be numerical,
+# so that compiled rules raise the same ValueError as interpreted ones
+NUMERICAL_SORTS = {
+    '<': ThingSort.are_ascending,
+    '>': ThingSort.are_descending,
+    '<=': ThingSort.are_ascending_or_equal,
+    '>=': ThingSort.are_descending_or_equal,
+}
+
+ADJACENCY = {
+    'adj': ThingSort.are_adjacent,
+    'adj<': ThingSort.are_adjacent_ascending,
+    'adj>': ThingSort.are_adjacent_descending,
+    'adjA': ThingSort.are_adjacent_alpha,
+    'adj<A': ThingSort.are_adjacent_ascending_alpha,
+    'adj>A': ThingSort.are_adjacent_descending_alpha,
+}
+
+MATH = {
+    '+': ThingMath.sum_is,
+    '-': ThingMath.difference_is,
+    '*': ThingMath.product_is,
+    '/': ThingMath.quotient_is,
+}
+
+class RuleCompiler:
+    g: Game
+    names: dict[Thing, str]
+    namespace: dict[str, object]
+    temporaries: itertools.count
+
+    def __init__(self: RuleCompiler, g: Game) -> None:
+        self.g = g
+        self.names = {}
+        self.namespace = {}
+        self.temporaries = itertools.count()
+
+        # Name Things by their order in the game file so the source is reproducible
+        for (i, t) in enumerate(g.keys.values()):
+            self.names[t] = f't{i}'
+            self.namespace[f't{i}'] = t
+
+        for (f, func) in itertools.chain(NUMERICAL_SORTS.items(), ADJACENCY.items(), MATH.items()):
+            self.namespace[self.get_helper(f)] = func
+
+    @staticmethod
+    def get_helper(f: str) -> str:
+        return '_' + ''.join(c if c.isalnum() else f'{ord(c):x}' for c in f)
+
+    @staticmethod
+    def get_kind(s: Symbol) -> int:
+        """The kind index of the Thing a Symbol resolves to, which is known statically."""
+        return s.path[-1] if s.path else s.thing.kind_index
+
+    def is_numerical(self: RuleCompiler, s: Symbol) -> bool:
+        """Whether every Thing the Symbol may resolve to has a numerical value."""
+        if not s.path:
+            return s.thing.value is not None
+        kind = self.get_kind(s)
+        return all(t.value is not None for t in self.names if t.kind_index == kind)
+
+    def compile_symbol(self: RuleCompiler, s: Symbol) -> str:
+        expr = self.names[s.thing]
+        for kind in s.path:
+            expr += f'.relationships[{kind}]'
+        return expr
+
+    def bind(self: RuleCompiler, s: Symbol) -> tuple[str, str]:
+        """
+        Return an expression that resolves the Symbol and stores it, and a name
+        for reusing the result. Plain Things need no temporary.
+        """
+        expr = self.compile_symbol(s)
+        if not s.path:
+            return (expr, expr)
+
+        name = f'_r{next(self.temporaries)}'
+        return (f'({name} := {expr})', name)
+
+    def compile_rule(self: RuleCompiler, r: Rule) -> str:
+        f = r.json['func']
+
+        match f:
+            case 'and':
+                return self.join(r.subrules, ' and ', 'True')
+            case 'or':
+                return self.join(r.subrules, ' or ', 'False')
+            case 'xor':
+                return f'({self.join(r.subrules, " + ", "0")} == 1)'
+            case 'nand':
+                return f'(not {self.join(r.subrules, " and ", "False")})' if r.subrules else 'False'
+            case 'nor' | 'not' | '!':
+                return f'(not {self.join(r.subrules, " or ", "False")})'
+
+        negate = f.startswith('!')
+        base = f[1:] if negate else f
+
+        match base:
+            case 'link':
+                expr = self.compile_link(r.symbols)
+            case 'same':
+                # As interpreted: no Things are neither all the same nor different
+                if not r.symbols:
+                    return 'False'
+                if len(r.symbols) < 2:
+                    return 'False' if negate else 'True'
+                # Things are equal iff they are the same object
+                expr = '(' + ' is '.join(self.compile_symbol(s) for s in r.symbols) + ')'
+            case _ if base in NUMERICAL_SORTS and not all(self.is_numerical(s) for s in r.symbols):
+                expr = f'{self.get_helper(base)}([{", ".join(self.compile_symbol(s) for s in r.symbols)}])'
+            case _ if base in SORTS:
+                if len(r.symbols) < 2:
+                    return 'False' if negate else 'True'
+                attribute = '.id' if base.endswith('A') else '.value'
+                expr = '(' + f' {SORTS[base]} '.join(self.compile_symbol(s) + attribute for s in r.symbols) + ')'
+            case _ if base in ADJACENCY:
+                expr = f'{self.get_helper(base)}([{", ".join(self.compile_symbol(s) for s in r.symbols)}])'
+            case _ if base in MATH:
+                expected = float(r.json['args'][0])
+                expr = f'{self.get_helper(base)}({expected!r}, [{", ".join(self.compile_symbol(s) for s in r.symbols)}])'
+            case _:
+                raise ValueError(f'Unknown function: {f}')
+
+        return f'(not {expr})' if negate else expr
+
+    def compile_link(self: RuleCompiler, symbols: list[Symbol]) -> str:
+        """
+        Thing.are_linked: any pair is linked both ways. Each Symbol is resolved
+        once, the first time a pair needs it.
+        """
+        bound = {}
+        pairs = []
+        for (a, b) in itertools.combinations(symbols, 2):
+            exprs = []
+            for s in (a, b):
+                if id(s) not in bound:
+                    first, name = self.bind(s)
+                    bound[id(s)] = name
+                    exprs.append(first)
+                else:
+                    exprs.append(bound[id(s)])
+
+            (ea, eb), (na, nb) = exprs, (bound[id(a)], bound[id(b)])
+            ka, kb = self.get_kind(a), self.get_kind(b)
+            pairs.append(f'({ea}.relationships[{kb}] is {eb} and {nb}.relationships[{ka}] is {na})')
+
+        return '(' + ' or '.join(pairs) + ')' if pairs else 'False'
+
+    def join(self: RuleCompiler, rules: list[Rule], op: str, empty: str) -> str:
+        if not rules:
+            return empty
+        return '(' + op.join(self.compile_rule(r) for r in rules) + ')'
+
+    def compile(self: RuleCompiler, rules: list[Rule], name: str = 'check') -> Callable[[], bool]:
+        """Return a function that is True iff every rule holds, checking them in order."""
+        lines = [f'def {name}():']
+        for r in rules:
+            lines.append(f'    # {str(r).replace(chr(10), " ")}')
+            lines.append(f'    if not {self.compile_rule(r)}: return False')
+        lines.append('    return True')
+        source = '\n'.join(lines) + '\n'
+
+        if source not in _cache:
+            _cache[source] = compile(source, f'<{name}>', 'exec')
+
+        namespace = dict(self.namespace)
+        exec(_cache[source], namespace)
+        return namespace[name]
+
+def compile_rules(g: Game, rules: list[Rule]) -> Callable[[], bool]:
+    return RuleCompiler(g).compile(rules)
+
+def compile_clues(g: Game) -> Callable[[], bool]:
+    """Compile every rule of every clue, in the current clue order."""
+    return compile_rules(g, list(r for clue in g.clues for r in clue.rules))
+
+def benchmark(g: Game, n: int = 20_000) -> dict[str, float]:
+    """
+    Time the interpreted and compiled clue checks over the first n worlds,
+    checking that they agree on every one. Return microseconds per world.
+    """
+    import solve
+
+    check = compile_clues(g)
+    interpreted, compiled = 0.0, 0.0
+    n = min(n, solve.count_worlds(g))
+
+    g.reset_relationships()
+    for world in itertools.islice(solve.get_all_worlds(g), n):
+        solve.realize_world(world)
+
+        start = time.perf_counter()
+        expected = all(clue.validate(g) for clue in g.clues)
+        middle = time.perf_counter()
+        result = check()
+        end = time.perf_counter()
+
+        if result != expected:
+            raise AssertionError(f'Compiled check disagrees on {world}')
+
+        interpreted += middle - start
+        compiled += end - middle
+        g.reset_relationships()
+
+    return {
+        'interpreted': interpreted / n * 1e6,
+        'compiled': compiled / n * 1e6,
+        'speedup': interpreted / compiled,
+    }
+
+if __name__ == '__main__':
+    from pathlib import Path
+
+    for path in sorted(Path('src/games/').glob('*.json')):
+        g = Game.parse_json(path)
+        g.optimize_clues()
+        result = benchmark(g)
+        print(f'{path.stem:15} interpreted {result["interpreted"]:7.2f} us/world   '
+              f'compiled {result["compiled"]:7.2f} us/world   x{result["speedup"]:.1f}')
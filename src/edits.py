@@ -0,0 +1,122 @@
+"""
+Re-solve a game after its clues were edited, starting from the solutions of
+the previous version instead of searching from scratch.
+
+Let the clues both versions share be C, the clues added A and the clues
+removed R. The old solutions are the worlds satisfying C and R, and the new
+ones are those satisfying C and A. These are:
+
+- the old solutions that also satisfy A, found by checking only A on them;
+- the worlds satisfying C and A but not all of R, which no old solution is,
+  so the two never overlap and nothing needs to be kept to drop repeats.
+  These are searched for with one extra clue, nand over every rule of R
+  (or the negation of the rule if there is one), which prunes the search
+  and the pre-solved grid like any other clue. With nothing removed, there
+  are none and no search is needed. The parallel engine's workers are
+  handed the extra clue with the others (see parallel.get_data).
+
+The things and kinds must not change between the versions.
+"""
+from __future__ import annotations
+import collections
+from typing import Iterable, Iterator
+from thing import Thing
+from game import Game, Clue, Rule
+import backtrack
+import cache
+import solve
+
+META = {'or', 'and', 'xor', 'nand', 'nor', 'not', '!'}
+NEGATIONS = {'and': 'nand', 'nand': 'and', 'or': 'nor', 'nor': 'or', 'not': 'or', '!': 'or'}
+
+def get_clue_key(clue: Clue) -> str:
+    """The canonical form of a Clue, which ignores the order of its rules and arguments."""
+    return cache.dumps(sorted((cache.normalize_rule(r.json) for r in clue.rules), key=cache.dumps))
+
+def get_diff(previous: Game, g: Game) -> tuple[list[Clue], list[Clue]]:
+    """
+    Return the clues of g that previous lacks, and the clues of previous that
+    g lacks. Raise ValueError if the games do not have the same things.
+    """
+    if cache.get_canonical(previous)['kinds'] != cache.get_canonical(g)['kinds']:
+        raise ValueError('The kinds or things of the game changed, so it must be solved again')
+
+    old = collections.Counter(get_clue_key(clue) for clue in previous.clues)
+    new = collections.Counter(get_clue_key(clue) for clue in g.clues)
+    return pick_clues(g.clues, new - old), pick_clues(previous.clues, old - new)
+
+def pick_clues(clues: list[Clue], counts: collections.Counter[str]) -> list[Clue]:
+    """The clues whose keys are counted, as many times as they are counted."""
+    picked = []
+    for clue in clues:
+        key = get_clue_key(clue)
+        if counts[key]:
+            counts[key] -= 1
+            picked.append(clue)
+    return picked
+
+def negate(json_rule: dict[str, object]) -> dict[str, object]:
+    """
+    The rule that holds iff this one fails. Every basic function f has a
+    negation !f (and the other way around), so pre-solving can still use it.
+    """
+    f, args = json_rule['func'], json_rule['args']
+    if f in NEGATIONS:
+        return {'func': NEGATIONS[f], 'args': args}
+    if f in META:
+        return {'func': 'nand', 'args': [json_rule]}
+    return {'func': f[1:] if f.startswith('!') else f'!{f}', 'args': args}
+
+def get_exclusion(g: Game, removed: list[Clue]) -> Clue:
+    """A Clue of g that holds iff some rule of the removed clues fails."""
+    rules = list(r.json for clue in removed for r in clue.rules)
+    r = Rule(negate(rules[0]) if len(rules) == 1 else {'func': 'nand', 'args': rules})
+    r.compile(g)
+
+    clue = Clue()
+    clue.rules.append(r)
+    return clue
+
+def filter_solutions(g: Game, solutions: Iterable[list[list[Thing]]], clues: list[Clue]) -> Iterator[list[list[Thing]]]:
+    """Yield the solutions (of g's Things) that satisfy the clues."""
+    check = backtrack.get_check(g, list(r for clue in clues for r in clue.rules))
+
+    g.reset_relationships()
+    try:
+        for world in solutions:
+            solve.realize_world(world)
+            passed = check()
+            g.reset_relationships()
+            if passed:
+                yield world
+    finally:
+        g.reset_relationships()
+
+def resolve(g: Game, previous: Game, solutions: Iterable[list[list[Thing]]],
+            engine: str = 'backtrack', progress: bool = True) -> Iterator[list[list[Thing]]]:
+    """
+    Yield the solutions of g given the solutions of a previous version of it,
+    in g's Things and layout: first the old solutions that survive, then any
+    that removing clues let in.
+    """
+    added, removed = get_diff(previous, g)
+
+    yield from filter_solutions(g, solutions, added)
+    if not removed:
+        return
+
+    # Search only the worlds the removed clues ruled out
+    exclusion = get_exclusion(g, removed)
+    grid = g.grid
+    g.clues.append(exclusion)
+    if g.checker is not None:
+        g.compile_clues()
+    if grid is not None:
+        g.presolve()
+    try:
+        yield from solve.iter_solutions(g, engine, progress=progress)
+    finally:
+        g.clues.remove(exclusion)
+        g.grid = grid
+        if g.checker is not None:
+            g.compile_clues()
@@ -1,22 +1,49 @@
 from __future__ import annotations
 from thing import Thing, ThingSort, ThingMath
 from pathlib import Path
+from typing import Callable, TYPE_CHECKING
 import json
 
+if TYPE_CHECKING:
+    from presolve import Grid
+
+MATH_FUNCS = {'+', '-', '*', '/', '!+', '!-', '!*', '!/'}
+
 class Symbol:
     name: str
+    thing: Thing
+    path: tuple[int, ...]
 
     def __init__(self: Symbol, name: str) -> None:
         self.name = name
+        self.thing, self.path = None, tuple()
+
+    def compile(self: Symbol, g: Game) -> None:
+        """
+        Parse the name once into the Thing it starts from and the chain of kind
+        indices to follow from there, e.g. 'A::B::C' is A's B's C.
+        """
+        key, *relationships = self.name.split('::')
+        kinds = list(g.sets)
+        for kind in relationships:
+            if kind not in g.sets:
+                raise KeyError(f'Unknown kind {kind!r} in symbol {self.name!r}')
+
+        self.thing = g.keys[key]
+        self.path = tuple(kinds.index(kind) for kind in relationships)
 
     def resolve(self: Symbol, g: Game) -> Thing:
-        if '::' not in self.name:
-            return g.keys[self.name]
-        
-        else:
-            key, relationship = self.name.split('::')
-            t = g.keys[key]
-            return t.relationships[relationship]
+        t = self.thing
+        for kind in self.path:
+            t = t.relationships[kind]
+        return t
+
+    def get_kinds(self: Symbol) -> set[int]:
+        """
+        Return the indices of the kinds that must be known to resolve this Symbol:
+        the kind of the Thing it starts from plus every kind along the chain.
+        """
+        return {self.thing.kind_index, *self.path}
 
     def __hash__(self: Symbol) -> int:
         return hash(self.name)
@@ -28,19 +55,36 @@ class Rule:
     json: dict[str, object]
     func: function
     symbols: list[Symbol]
+    resolved: list[Thing|None]
     subrules: list[Rule]
 
     def __init__(self: Rule, json: dict[str, object]) -> None:
         self.json = json
-        self.func, self.symbols, self.subrules = None, list(), list()
+        self.func, self.symbols, self.resolved, self.subrules = None, list(), list(), list()
+        self.build_func()
 
         f, args = json['func'], json['args']
 
+        # The operation argument of math is not a symbol
+        if f in MATH_FUNCS:
+            args = args[1:]
+
+        basic = f not in {'or', 'and', 'xor', 'nand', 'nor', 'not', '!'}
+
+        if basic:
+            self.symbols = list(Symbol(arg) for arg in args)
+            self.resolved = [None] * len(self.symbols)
+
+        else:
+            self.subrules = list(Rule(arg) for arg in args)
+
+    def build_func(self: Rule) -> None:
+        """Set func, the closure that evaluates this Rule, from its JSON."""
+        f, args = self.json['func'], self.json['args']
+
         # Extract the operation argument if it's math
-        math = f in {'+', '-', '*', '/', '!+', '!-', '!*', '!/'}
-        if math:
+        if f in MATH_FUNCS:
             math_result = float(args[0])
-            args = args[1:]
 
         match f:
 
@@ -153,20 +197,29 @@ class Rule:
                 self.func = lambda g: sum(r.evaluate(g) for r in self.subrules) < len(self.subrules)
             case 'nor' | 'not' | '!':
                 self.func = lambda g: not any(r.evaluate(g) for r in self.subrules)
-        
-        basic = f not in {'or', 'and', 'xor', 'nand', 'nor', 'not', '!'}
 
-        if basic:
-            self.symbols = list(Symbol(arg) for arg in args)
+    def __getstate__(self: Rule) -> dict[str, object]:
+        # Closures cannot be pickled, so func is built again on unpickling
+        state = dict(self.__dict__)
+        state['func'] = None
+        return state
 
-        else:
-            self.subrules = list(Rule(arg) for arg in args)
+    def __setstate__(self: Rule, state: dict[str, object]) -> None:
+        self.__dict__.update(state)
+        self.build_func()
     
     def evaluate(self: Rule, g: Game) -> bool:
         return self.func(g)
     
-    def resolve_symbols(self: Rule, g: Game) -> set[Thing]:
-        return [s.resolve(g) for s in self.symbols]
+    def resolve_symbols(self: Rule, g: Game) -> list[Thing|None]:
+        """
+        Resolve each Symbol into the same list every time, which is only
+        valid until the next evaluation; copy it to keep it.
+        """
+        resolved = self.resolved
+        for (i, s) in enumerate(self.symbols):
+            resolved[i] = s.resolve(g)
+        return resolved
     
     def __repr__(self: Rule) -> str:
         if self.symbols:
@@ -174,6 +227,25 @@ class Rule:
         else:
             return f'{self.json["func"]}({",".join((str(r) for r in self.subrules))})'
     
+    def compile(self: Rule, g: Game) -> None:
+        """Compile the Symbols of this Rule and its subrules."""
+        for s in self.symbols:
+            s.compile(g)
+        for r in self.subrules:
+            r.compile(g)
+
+    def get_kinds(self: Rule) -> set[int]:
+        """
+        Return the indices of the kinds this Rule reads, i.e. the kinds whose relationships
+        must be realized before it can be evaluated.
+        """
+        kinds = set()
+        for s in self.symbols:
+            kinds |= s.get_kinds()
+        for r in self.subrules:
+            kinds |= r.get_kinds()
+        return kinds
+
     def get_complexity(self: Rule) -> int:
         """
         Return a number indicating the complexity (a function of the subrules).
@@ -199,6 +271,10 @@ class Clue:
         """
         self.rules.sort(key=lambda r: r.get_complexity())
 
+    def get_kinds(self: Clue) -> set[int]:
+        """Return the indices of the kinds any of this Clue's Rules read."""
+        return set().union(*(r.get_kinds() for r in self.rules))
+
     def get_complexity(self: Clue) -> int:
         """
         Return the sum of the complexity of this Clue's Rules.
@@ -207,13 +283,25 @@ class Clue:
 
 class Game:
     keys: dict[str, Thing]
-    sets: dict[str, set[Thing]]
+    sets: dict[str, list[Thing]]
     clues: list[Clue]
+    data: dict[str, object]
+    checker: Callable[[], bool]|None
+    grid: Grid|None
 
     def __init__(self: Game) -> None:
         self.keys = dict()
         self.sets = dict()
         self.clues = list()
+        self.data = dict()
+        self.checker = None
+        self.grid = None
+
+    def __getstate__(self: Game) -> dict[str, object]:
+        # The compiled checker cannot be pickled; see snapshot.py
+        state = dict(self.__dict__)
+        state['checker'] = None
+        return state
 
     def things(self: Game) -> set[Thing]:
         return set(self.keys.values())
@@ -224,6 +312,9 @@ class Game:
 
     def validate_all_clues(self: Game) -> bool:
         """This is written verbosely so as to make debugging easier."""
+        if self.checker is not None:
+            return self.checker()
+
         for clue in self.clues:
             if not clue.validate(self):
                 # print('CLUE FAILED:', clue)
@@ -247,20 +338,48 @@ class Game:
             clue.optimize_rules()
         self.clues.sort(key=lambda c: c.get_complexity())
     
+    def compile_clues(self: Game) -> None:
+        """
+        Replace the interpreted clue checks with one generated function
+        (see compiler.py). Compile again after reordering the clues.
+        """
+        import compiler
+        self.checker = compiler.compile_clues(self)
+
+    def presolve(self: Game) -> None:
+        """
+        Apply the clues that fix or forbid single cells to an elimination grid
+        (see presolve.py), which world generation then uses to skip worlds.
+        """
+        import presolve
+        self.grid = presolve.presolve(self)
+
     @staticmethod
     def parse_json(path: Path) -> Game:
-        g = Game()
-
         with open(path, 'r') as f:
             data = json.loads(f.read())
-        
-        # Parse groups of things
-        for group in data['kinds']:
+
+        return Game.parse_data(data)
+
+    @staticmethod
+    def parse_data(data: dict[str, object]) -> Game:
+        """
+        Parse a game object with the same schema as a game file.
+        The data is kept so that the Game can be parsed again elsewhere,
+        e.g. in another process.
+        """
+        g = Game()
+        g.data = data
+
+        # Parse groups of things, numbering each thing and kind
+        index = 0
+        for (kind_index, group) in enumerate(data['kinds']):
             name, things = group['name'], group['things']
-            s = set()
+            s = []
             for thing in things:
-                t = Thing(thing, name)
-                s.add(t)
+                t = Thing(thing, name, index, kind_index, len(data['kinds']))
+                index += 1
+                s.append(t)
                 g.keys[thing] = t
             g.sets[name] = s
 
@@ -269,11 +388,15 @@ class Game:
             for thing in g.sets[kind]:
                 thing.fellows = g.sets[kind]
 
+        for thing in g.things():
+            thing.rank_fellows()
+
         # Parse clues
         for clue in data['clues']:
             c = Clue()
             for json_rule in clue:
                 r = Rule(json_rule)
+                r.compile(g)
                 c.rules.append(r)
             g.clues.append(c)
         
@@ -1,11 +1,19 @@
 from __future__ import annotations
 from pathlib import Path
-from game import Game
+from typing import Iterator, Sequence
 from thing import Thing
+from cache import SolutionCache, get_key
+from profiler import Profiler
+from solfile import SolutionFile
+import edits
+import snapshot
+import solfile
 import solve
-from tabulate import tabulate
 
 def print_solution(sol: list[list[Thing]]) -> None:
+    # Imported here so that solving without viewing does not pay for it
+    from tabulate import tabulate
+
     headers = ['Set'] + list(range(1, len(sol) + 1))
     kinds = list(t.kind for t in sol[0])
     cols = [kinds[:], *[g[:] for g in sol]]
@@ -18,7 +26,7 @@ def print_solution(sol: list[list[Thing]]) -> None:
 
     print(tabulate(rows, headers=headers, tablefmt="rounded_grid"))
 
-def print_solutions(solutions: list[list[list[Thing]]]) -> None:
+def print_solutions(solutions: Sequence[list[list[Thing]]]) -> None:
     if not solutions:
         input('Press Enter to quit')
         return
@@ -50,16 +58,61 @@ def pick_path(L: list[Path]) -> Path:
     number = int(input('Selection (enter number): '))
     return choices[number - 1]
 
-def run() -> None:
+def run(engine: str = 'backtrack', profile: bool = False, use_cache: bool = True) -> None:
+    """
+    Solve a game picked from src/games/. The prepared game is loaded from its
+    snapshot, and its solutions from the cache, if the game is unchanged since
+    it was last solved. If only its clues changed, it is re-solved from the
+    solutions of the previous version (see edits.py). Profiling always solves.
+
+    Solutions are streamed to a solution file as they are found, and viewed
+    from it one at a time, so memory use does not grow with their number.
+    """
     paths = Path('src/games/').glob('*.json')
     path = pick_path(paths)
 
-    g = Game.parse_json(path)
-    g.optimize_clues()
-    solutions = solve.find_solutions(g)
+    # Imported here so that startup does not pay for it
+    import tempfile
+
+    previous = snapshot.load_previous(path)
+    g = snapshot.load_game(path)
+
+    # E.g. an engine that cannot take kinds of different sizes
+    try:
+        solve.check_engine(g, engine)
+    except ValueError as e:
+        print(f'\nCould not solve {path.stem} with the {engine} engine: {e}')
+        return
+    cache = SolutionCache() if use_cache else None
+    solutions = cache.get(g) if cache is not None and not profile else None
+
+    # After the clues were edited, start from the solutions of the previous version
+    old = None
+    if solutions is None and cache is not None and previous is not None and not profile:
+        old = cache.open(get_key(previous), g)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if solutions is None:
+            def _store(found: Iterator[list[list[Thing]]]) -> SolutionFile:
+                if cache is not None:
+                    return cache.put(g, found)
+                scratch_path = Path(scratch) / f'{path.stem}.sol'
+                solfile.write_solutions(scratch_path, g, found)
+                return SolutionFile(scratch_path, g)
+
+            if profile:
+                with Profiler(g) as p:
+                    solutions = _store(solve.iter_solutions(g, engine=engine))
+                print(f'\n{p.table()}')
+            elif old is not None:
+                with old:
+                    solutions = _store(edits.resolve(g, previous, old, engine))
+            else:
+                solutions = _store(solve.iter_solutions(g, engine=engine))
 
-    print(f'\nFound {len(solutions)} solution(s).')
-    print_solutions(solutions)
+        with solutions:
+            print(f'\nFound {len(solutions)} solution(s).')
+            print_solutions(solutions)
 
 if __name__ == '__main__':
     run()
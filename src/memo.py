@@ -0,0 +1,209 @@
+"""
+Opt-in memoization of clue and rule evaluation.
+
+A Rule (or Clue) reads only the kinds its Symbols go through (see
+Rule.get_kinds), so its result depends only on the world's projection onto
+those kinds: which Thing of each of them shares a row with each Thing of
+the first of them. Many worlds share a projection, e.g. a rule on
+Magazine::Last Day only changes when the Magazine-Last Day pairing does, so
+while a Memo is attached each Clue.validate and each complex enough
+Rule.evaluate (e.g. an and or xor of other rules) is looked up by its
+projection first, and only evaluated on a miss. Clues and rules reading
+every kind are left alone, since no search visits a world twice. The cache
+is bounded, evicting the least recently used result.
+
+Like the Profiler, attaching wraps the instances only and switches the
+Game to interpreted evaluation, since compiled checks bypass the Rules.
+The brute, incremental, backtrack and planned engines relate whole kinds,
+so every evaluation is looked up. The bitset engine relates only the rows
+it has fixed, and an evaluation before all the projected rows are related
+is passed through uncounted. The sat, numpy and parallel engines do not
+evaluate Rules in this process, so a memo does nothing for them.
+
+    with Memo(g) as m:
+        solve.find_solutions(g, engine='brute')
+    print(m.table())
+"""
+from __future__ import annotations
+import collections
+from typing import Callable
+from game import Game, Clue, Rule
+
+DEFAULT_MAX_ENTRIES = 100_000
+
+# Rules simpler than this are cheaper to evaluate than to look up
+MIN_COMPLEXITY = 3
+
+class Stats:
+    hits: int
+    misses: int
+
+    def __init__(self: Stats) -> None:
+        self.hits, self.misses = 0, 0
+
+    @property
+    def lookups(self: Stats) -> int:
+        return self.hits + self.misses
+
+    def get_hit_rate(self: Stats) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def to_json(self: Stats) -> dict[str, object]:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.get_hit_rate()}
+
+class Memo:
+    g: Game
+    max_entries: int
+    min_complexity: int
+    cache: collections.OrderedDict[tuple[object, tuple[int, ...]], bool]
+    evictions: int
+    clues: dict[Clue, Stats]
+    rules: dict[Rule, Stats]
+    saved: dict[Rule, Callable[[Game], bool]]
+    checker: Callable[[], bool]|None
+
+    def __init__(self: Memo, g: Game, max_entries: int = DEFAULT_MAX_ENTRIES, min_complexity: int = MIN_COMPLEXITY) -> None:
+        self.g = g
+        self.max_entries = max_entries
+        self.min_complexity = min_complexity
+        self.cache = collections.OrderedDict()
+        self.evictions = 0
+        self.clues, self.rules, self.saved = {}, {}, {}
+        self.checker = None
+
+    def get_projection(self: Memo, kinds: set[int]) -> Callable[[], tuple[int, ...]]:
+        """
+        Return a function of the realized world that identifies its projection
+        onto the kinds: the index of the Thing of each other kind in the row
+        of each Thing of the first kind.
+        """
+        if len(kinds) < 2:
+            return lambda: ()
+
+        # Generated with the lookups written out, since this runs for every evaluation
+        first, *rest = sorted(kinds)
+        things = list(self.g.sets.values())[first]
+        namespace = {f't{i}': t for (i, t) in enumerate(things)}
+        lookups = ', '.join(f't{i}.relationships[{k}].index' for i in range(len(things)) for k in rest)
+        return eval(f'lambda: ({lookups},)', namespace)
+
+    def wrap(self: Memo, func: Callable[[Game], bool], owner: object, kinds: set[int], stats: Stats) -> Callable[[Game], bool]:
+        cache, project = self.cache, self.get_projection(kinds)
+
+        def _memoized(g: Game) -> bool:
+            try:
+                key = (owner, project())
+            except AttributeError:
+                # Some engines (e.g. bitset) relate only some rows, so there is no projection yet
+                return func(g)
+            result = cache.get(key)
+            if result is not None:
+                stats.hits += 1
+                cache.move_to_end(key)
+                return result
+
+            stats.misses += 1
+            result = cache[key] = func(g)
+            if len(cache) > self.max_entries:
+                cache.popitem(last=False)
+                self.evictions += 1
+            return result
+
+        return _memoized
+
+    def attach(self: Memo) -> None:
+        self.checker, self.g.checker = self.g.checker, None
+        self.cache.clear()
+
+        for clue in self.g.clues:
+            if self.is_worth(clue.get_kinds()):
+                stats = self.clues.setdefault(clue, Stats())
+                clue.validate = self.wrap(clue.validate, clue, clue.get_kinds(), stats)
+            for rule in clue.rules:
+                self.attach_rule(rule)
+
+    def is_worth(self: Memo, kinds: set[int]) -> bool:
+        """
+        Whether results on these kinds can repeat. A projection onto every kind
+        is the whole world, which no search visits twice.
+        """
+        return len(kinds) < len(self.g.sets)
+
+    def attach_rule(self: Memo, rule: Rule) -> None:
+        if rule.get_complexity() >= self.min_complexity and self.is_worth(rule.get_kinds()):
+            stats = self.rules.setdefault(rule, Stats())
+            self.saved[rule] = rule.func
+            rule.func = self.wrap(rule.func, rule, rule.get_kinds(), stats)
+        for r in rule.subrules:
+            self.attach_rule(r)
+
+    def detach(self: Memo) -> None:
+        for clue in self.clues:
+            del clue.validate
+        for (rule, func) in self.saved.items():
+            rule.func = func
+        self.saved = {}
+        self.g.checker = self.checker
+
+    def __enter__(self: Memo) -> Memo:
+        self.attach()
+        return self
+
+    def __exit__(self: Memo, *_) -> None:
+        self.detach()
+
+    def get_total(self: Memo) -> Stats:
+        """The hits and misses of every clue and rule together."""
+        total = Stats()
+        for stats in (*self.clues.values(), *self.rules.values()):
+            total.hits += stats.hits
+            total.misses += stats.misses
+        return total
+
+    def to_json(self: Memo) -> dict[str, object]:
+        """Return the total stats, then those of every clue, in the current clue order, with its memoized rules nested."""
+        def _rule(r: Rule) -> dict[str, object]:
+            return {
+                'rule': str(r),
+                'kinds': sorted(r.get_kinds()),
+                **(self.rules[r].to_json() if r in self.rules else {}),
+                'subrules': list(_rule(sub) for sub in r.subrules),
+            }
+
+        return {
+            **self.get_total().to_json(),
+            'entries': len(self.cache),
+            'evictions': self.evictions,
+            'clues': list({
+                'clue': i + 1,
+                'kinds': sorted(clue.get_kinds()),
+                **self.clues.get(clue, Stats()).to_json(),
+                'rules': list(_rule(r) for r in clue.rules),
+            } for (i, clue) in enumerate(self.g.clues)),
+        }
+
+    def table(self: Memo) -> str:
+        """Return the stats as a text table, memoized rules indented under their clue."""
+        kinds = list(self.g.sets)
+        lines = [f'{"clue":>4}  {"rule":50} {"kinds":24} {"hits":>10} {"misses":>8} {"hit %":>6}']
+
+        def _line(label: str, name: str, reads: set[int], stats: Stats) -> None:
+            names = ','.join(kinds[k] for k in sorted(reads))
+            lines.append(f'{label:>4}  {name[:50]:50} {names[:24]:24} {stats.hits:>10} '
+                         f'{stats.misses:>8} {stats.get_hit_rate() * 100:>6.1f}')
+
+        def _rule(r: Rule, depth: int) -> None:
+            if r in self.rules:
+                _line('', '  ' * depth + str(r), r.get_kinds(), self.rules[r])
+            for sub in r.subrules:
+                _rule(sub, depth + 1)
+
+        for (i, clue) in enumerate(self.g.clues):
+            _line(str(i + 1), '(all rules)', clue.get_kinds(), self.clues.get(clue, Stats()))
+            for r in clue.rules:
+                _rule(r, 1)
+
+        total = self.get_total()
+        lines.append(f'\nTotal: {total.hits} hits, {total.misses} misses ({total.get_hit_rate() * 100:.1f}% hit), '
+                     f'{len(self.cache)} entries, {self.evictions} evicted')
+        return '\n'.join(lines)
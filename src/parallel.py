@@ -0,0 +1,72 @@
+"""
+A parallel brute force engine. The worlds are split into shards by the
+permutation chosen for the second kind, and the shards are checked in a
+process pool. Things are mutable and shared by every world, so each worker
+parses its own copy of the Game; shards and solutions cross the process
+boundary as Thing ids only.
+"""
+from __future__ import annotations
+import multiprocessing
+from typing import Iterator
+from thing import Thing
+from game import Game
+import solve
+
+# A shard fixes the second kind: the id of the Thing paired with each Thing of the first kind
+Shard = tuple[tuple[str, str], ...]
+
+# A solution as Thing ids, one row per Thing of the first kind
+IdWorld = list[list[str]]
+
+_game: Game = None
+
+def _init_worker(data: dict[str, object]) -> None:
+    global _game
+    _game = Game.parse_data(data)
+    _game.optimize_clues()
+    _game.compile_clues()
+    _game.presolve()
+
+def _solve_shard(shard: Shard) -> list[IdWorld]:
+    g = _game
+    worlds = iter([[[g.keys[a], g.keys[b]] for (a, b) in shard]])
+    for group in list(g.sets.values())[2:]:
+        worlds = solve.expand_worlds(worlds, group, g.grid)
+
+    return list(list(list(t.id for t in row) for row in world) for world in solve.check_worlds(g, worlds))
+
+def get_data(g: Game) -> dict[str, object]:
+    """
+    The game data for the workers to parse, with the Game's current clues,
+    which may differ from the file's (e.g. the extra clue of edits.resolve).
+    """
+    return g.data | {'clues': list(list(r.json for r in clue.rules) for clue in g.clues)}
+
+def get_shards(g: Game) -> list[Shard]:
+    """Return one shard per permutation of the second kind, in get_all_worlds order."""
+    first, second, *_ = list(g.sets.values())
+    rows = list([t] for t in first)
+    return list(tuple((a.id, b.id) for (a, b) in zip(first, perm)) for perm in solve.get_permutations(second, rows, 1, g.grid))
+
+def iter_solutions(g: Game, processes: int|None = None) -> Iterator[list[list[Thing]]]:
+    """
+    Yield the solutions shard by shard, in the same order as the brute force
+    engine regardless of which worker finishes first (Game.sets keeps the
+    order of the game file, so every worker enumerates the same way).
+    Closing the generator (e.g. once enough solutions have been taken)
+    terminates every worker.
+    """
+    if len(g.sets) < 2:
+        yield from solve.brute_force(g)
+        return
+
+    pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(get_data(g),))
+
+    try:
+        for found in pool.imap(_solve_shard, get_shards(g)):
+            for world in found:
+                yield list(list(g.keys[id] for id in row) for row in world)
+
+    finally:
+        pool.terminate()
+        pool.join()
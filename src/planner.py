@@ -0,0 +1,168 @@
+"""
+Plan the order in which kinds are expanded into worlds, like a query
+planner choosing the order of joins. get_all_worlds expands kinds in file
+order, permuting each against the first, whatever the clues constrain.
+
+The plan instead estimates how many partial worlds each order generates:
+expanding a kind multiplies the partial worlds by its permutations (fewer
+if the pre-solved grid rules cells out), and each rule that becomes
+evaluable then keeps only its share of them, its pass rate measured over a
+sample of random worlds. From each kind in turn as the one the others are
+permuted against, kinds are taken greedily, the one leaving the fewest
+partial worlds first (or the one most connected by rules to those taken),
+and the order generating the fewest partial worlds in all wins.
+
+Worlds are then built as a chain of expand_worlds steps in that order.
+After each step every rule whose kinds have all been expanded is checked
+against the partial worlds, and those that fail are dropped before the
+next step multiplies them.
+
+Solutions are yielded in the same format as the other engines, but in the
+order of the plan.
+"""
+from __future__ import annotations
+import math
+from typing import Callable, Iterable, Iterator
+from thing import Thing
+from game import Game, Rule
+import backtrack
+import solve
+
+# The number of random worlds the rules' pass rates are measured over
+SAMPLE = 200
+
+def relate_rows(world: list[list[Thing]]) -> None:
+    """Relate the Things of each row, which is cheaper than solve.realize_world."""
+    for row in world:
+        for t in row:
+            for other in row:
+                t.set(other.kind_index, other)
+
+def unrelate_rows(world: list[list[Thing]]) -> None:
+    for row in world:
+        for t in row:
+            t.reset_relationships()
+
+def is_resolvable(r: Rule) -> bool:
+    """
+    Whether every Symbol of the Rule and its subrules resolves to a Thing in
+    the realized world. One that goes through a Thing no row holds (when its
+    kind has more things than there are rows) resolves to None.
+    """
+    for s in r.symbols:
+        t = s.thing
+        for kind in s.path:
+            t = t.relationships[kind]
+            if t is None:
+                return False
+    return all(is_resolvable(sub) for sub in r.subrules)
+
+def get_pass_rates(g: Game, rules: list[Rule], sample: int = SAMPLE) -> list[float]:
+    """The share of random worlds each rule passes, never quite 0."""
+    passed = [0] * len(rules)
+
+    g.reset_relationships()
+    for world in solve.get_random_worlds(g, sample):
+        relate_rows(world)
+        for (i, r) in enumerate(rules):
+            # Counted as failing: the other engines cannot evaluate it either
+            if not is_resolvable(r):
+                continue
+            try:
+                passed[i] += r.evaluate(g)
+            except (ValueError, ZeroDivisionError):
+                # Some rules only make sense in worlds the clues before them allow
+                pass
+        unrelate_rows(world)
+
+    return list((n + 1) / (sample + 1) for n in passed)
+
+def get_permutations(g: Game, pivot: int, k: int) -> float:
+    """Estimate how many permutations of kind k expanding against the pivot kind generates."""
+    groups = list(g.sets.values())
+    n = len(groups[k])
+    if g.grid is None:
+        return math.factorial(n)
+    # Scale n! by the share of cells the grid leaves open
+    return math.factorial(n) * math.prod(len(g.grid.domains[f][k]) / n for f in groups[pivot])
+
+def plan_kinds(g: Game, sample: int = SAMPLE) -> list[int]:
+    """The indices of the kinds in the order to expand them."""
+    rules = list(r for clue in g.clues for r in clue.rules)
+    kinds = list(frozenset(r.get_kinds()) for r in rules)
+    rates = get_pass_rates(g, rules, sample)
+
+    def _plan(pivot: int) -> tuple[float, list[int]]:
+        order, worlds, cost = [pivot], 1.0, 0.0
+        remaining = list(k for k in range(len(g.sets)) if k != pivot)
+
+        def _after(k: int) -> float:
+            """The partial worlds left after expanding kind k next."""
+            joined = {*order, k}
+            rate = math.prod(rate for (ks, rate) in zip(kinds, rates) if k in ks and ks <= joined)
+            return worlds * get_permutations(g, pivot, k) * rate
+
+        def _connected(k: int) -> int:
+            return sum(len(ks & set(order)) for ks in kinds if k in ks)
+
+        while remaining:
+            best = min(remaining, key=lambda k: (_after(k), -_connected(k), k))
+            cost += worlds * get_permutations(g, pivot, best)
+            worlds = _after(best)
+            order.append(best)
+            remaining.remove(best)
+
+        return cost, order
+
+    # The pivot's Things are the rows, so it must have no more things than the first kind
+    groups = list(g.sets.values())
+    pivots = list(k for (k, group) in enumerate(groups) if len(group) == len(groups[0]))
+    (_, order) = min(_plan(pivot) for pivot in pivots)
+    return order
+
+def plan_rules(g: Game, order: list[int]) -> list[list[Rule]]:
+    """
+    Return, for each kind in the planned order, the Rules that become
+    evaluable once that kind is expanded.
+    """
+    steps = [[] for _ in order]
+    for clue in g.clues:
+        for rule in clue.rules:
+            steps[max((order.index(k) for k in rule.get_kinds()), default=0)].append(rule)
+    return steps
+
+def filter_worlds(g: Game, worlds: Iterable[list[list[Thing]]], check: Callable[[], bool]) -> Iterator[list[list[Thing]]]:
+    """Yield the (partial) worlds that pass the check."""
+    g.reset_relationships()
+
+    try:
+        for world in worlds:
+            relate_rows(world)
+            passed = check()
+            unrelate_rows(world)
+
+            if passed:
+                yield world
+
+    finally:
+        g.reset_relationships()
+
+def get_planned_worlds(g: Game, order: list[int]) -> Iterator[list[list[Thing]]]:
+    """
+    Lazily yield every world that satisfies every clue, expanding kinds in the
+    given order. Each row holds its Things in that order.
+    """
+    first, *groups = list(list(g.sets.values())[k] for k in order)
+    checks = list(backtrack.get_check(g, rules) for rules in plan_rules(g, order))
+
+    worlds = filter_worlds(g, iter([[[t] for t in first]]), checks[0])
+    for (group, check) in zip(groups, checks[1:]):
+        worlds = filter_worlds(g, solve.expand_worlds(worlds, group, g.grid), check)
+
+    return worlds
+
+def iter_solutions(g: Game) -> Iterator[list[list[Thing]]]:
+    for world in get_planned_worlds(g, plan_kinds(g)):
+        # Back to the Game's layout: a row per Thing of its first kind, in kind order
+        rows = list(sorted(row, key=lambda t: t.kind_index) for row in world)
+        yield sorted(rows, key=lambda row: row[0].index)
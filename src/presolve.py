@@ -0,0 +1,129 @@
+"""
+Static pre-solving. Rules that fix or forbid a single cell of the classic
+elimination grid (e.g. link(Isac, Chicken) or !link(Lyon's, Yvette)) are
+applied to a Grid of the Things each Thing may still be linked with, and
+then propagated: a Thing links to exactly one Thing of each other kind,
+and a and c can only be linked if some Thing of every other kind can be
+linked with both.
+
+The grid only ever removes worlds that some Rule would reject, and every
+clue is still checked against the worlds that remain, so pre-solving never
+changes the solutions.
+"""
+from __future__ import annotations
+import itertools
+from thing import Thing
+from game import Game, Rule, Symbol
+
+class Grid:
+    groups: list[list[Thing]]
+    domains: dict[Thing, list[set[Thing]]]
+
+    def __init__(self: Grid, g: Game) -> None:
+        self.groups = list(g.sets.values())
+        self.domains = {}
+        for t in g.things():
+            self.domains[t] = list(set(group) for group in self.groups)
+            self.domains[t][t.kind_index] = {t}
+
+    def is_possible(self: Grid, a: Thing, b: Thing) -> bool:
+        return b in self.domains[a][b.kind_index]
+
+    def eliminate(self: Grid, a: Thing, b: Thing) -> bool:
+        """Rule out a and b being linked. Return True iff that is news."""
+        if not self.is_possible(a, b):
+            return False
+        self.domains[a][b.kind_index].discard(b)
+        self.domains[b][a.kind_index].discard(a)
+        return True
+
+    def confirm(self: Grid, a: Thing, b: Thing) -> bool:
+        """Rule out everything but a and b being linked. Return True iff that is news."""
+        changed = False
+        for other in self.groups[b.kind_index]:
+            if other is not b:
+                changed |= self.eliminate(a, other)
+        for other in self.groups[a.kind_index]:
+            if other is not a:
+                changed |= self.eliminate(other, b)
+        return changed
+
+    def apply_rule(self: Grid, r: Rule) -> None:
+        """Apply the Rule if it fixes or forbids cells, and otherwise ignore it."""
+        f = r.json['func']
+
+        match f:
+            case 'and':
+                for sub in r.subrules:
+                    self.apply_rule(sub)
+            case 'link' if len(r.symbols) == 2:
+                a, b = r.symbols
+                if self.is_cell(a, b):
+                    self.confirm(a.thing, b.thing)
+            case '!link':
+                # No two of the Things are linked
+                for (a, b) in itertools.combinations(r.symbols, 2):
+                    if self.is_cell(a, b):
+                        self.eliminate(a.thing, b.thing)
+            case 'same':
+                # Every symbol is the same Thing, so A::Kind is b for each pair
+                for (a, b) in itertools.permutations(r.symbols, 2):
+                    if self.is_kind_of(a, b):
+                        self.confirm(a.thing, b.thing)
+            case '!same' if len(r.symbols) == 2:
+                for (a, b) in itertools.permutations(r.symbols, 2):
+                    if self.is_kind_of(a, b):
+                        self.eliminate(a.thing, b.thing)
+
+    @staticmethod
+    def is_cell(a: Symbol, b: Symbol) -> bool:
+        """Both Symbols are plain Things of different kinds."""
+        return not a.path and not b.path and a.thing.kind_index != b.thing.kind_index
+
+    @staticmethod
+    def is_kind_of(a: Symbol, b: Symbol) -> bool:
+        """a is A::Kind and b is a plain Thing of that Kind, which is not A's."""
+        return (len(a.path) == 1 and not b.path
+                and a.path[0] == b.thing.kind_index != a.thing.kind_index)
+
+    def propagate(self: Grid) -> None:
+        """Apply the consequences of the grid until nothing changes."""
+        changed = True
+        while changed:
+            changed = False
+
+            # A Thing with one candidate of a kind is linked with it
+            for (a, domains) in self.domains.items():
+                for (k, domain) in enumerate(domains):
+                    if len(domain) == 1 and k != a.kind_index:
+                        changed |= self.confirm(a, next(iter(domain)))
+
+            # a and c can only be linked via a possible Thing of every other kind
+            for (ka, kb, kc) in itertools.permutations(range(len(self.groups)), 3):
+                for a in self.groups[ka]:
+                    for c in list(self.domains[a][kc]):
+                        if not any(self.is_possible(b, c) for b in self.domains[a][kb]):
+                            changed |= self.eliminate(a, c)
+
+    def allows(self: Grid, row: list[Thing], k: int, t: Thing) -> bool:
+        """Whether t may join the row's first k Things (of any kinds other than t's)."""
+        return all(t in self.domains[row[j]][t.kind_index] for j in range(k))
+
+    def get_masks(self: Grid, rows: list[list[Thing]], k: int, items: list[Thing]) -> list[int]:
+        """For each row, the bitmask of the items (Things of one kind) that may join its first k Things."""
+        return list(sum(1 << i for (i, t) in enumerate(items) if self.allows(row, k, t)) for row in rows)
+
+def presolve(g: Game) -> Grid|None:
+    """
+    Return the propagated Grid of the Game, or None if it has kinds of
+    different sizes, where a Thing need not be linked with every kind.
+    """
+    if len(set(len(s) for s in g.sets.values())) > 1:
+        return None
+
+    grid = Grid(g)
+    for clue in g.clues:
+        for r in clue.rules:
+            grid.apply_rule(r)
+    grid.propagate()
+    return grid
@@ -0,0 +1,189 @@
+"""
+Opt-in profiling of clue and rule evaluation.
+
+While a Profiler is attached to a Game, every Clue.validate and
+Rule.evaluate (including subrules) records how often it ran, how often it
+passed or failed, and the time spent in it. Attaching wraps the instances
+only, and detaching restores them, so there is no cost when profiling is
+off. Compiled checks bypass the Rules, so attaching also switches the Game
+back to interpreted evaluation for the duration.
+
+    with Profiler(g) as p:
+        solve.find_solutions(g, engine='incremental')
+    print(p.table())
+"""
+from __future__ import annotations
+import math
+import time
+from typing import Callable
+from game import Game, Clue, Rule
+
+class Stats:
+    evaluations: int
+    passed: int
+    seconds: float
+
+    def __init__(self: Stats) -> None:
+        self.evaluations, self.passed, self.seconds = 0, 0, 0.0
+
+    @property
+    def failed(self: Stats) -> int:
+        return self.evaluations - self.passed
+
+    def get_rejection_rate(self: Stats) -> float:
+        return self.failed / self.evaluations if self.evaluations else 0.0
+
+    def get_cost(self: Stats) -> float:
+        """Mean seconds per evaluation."""
+        return self.seconds / self.evaluations if self.evaluations else 0.0
+
+    def to_json(self: Stats) -> dict[str, object]:
+        return {
+            'evaluations': self.evaluations,
+            'passed': self.passed,
+            'failed': self.failed,
+            'seconds': self.seconds,
+        }
+
+class Profiler:
+    g: Game
+    clues: dict[Clue, Stats]
+    rules: dict[Rule, Stats]
+    saved: dict[Rule, Callable[[Game], bool]]
+    checker: Callable[[], bool]|None
+
+    def __init__(self: Profiler, g: Game) -> None:
+        self.g = g
+        self.clues, self.rules, self.saved = {}, {}, {}
+        self.checker = None
+
+    @staticmethod
+    def wrap(func: Callable[[Game], bool], stats: Stats) -> Callable[[Game], bool]:
+        def _profiled(g: Game) -> bool:
+            start = time.perf_counter()
+            result = func(g)
+            stats.seconds += time.perf_counter() - start
+            stats.evaluations += 1
+            stats.passed += result
+            return result
+        return _profiled
+
+    def attach(self: Profiler) -> None:
+        self.checker, self.g.checker = self.g.checker, None
+
+        for clue in self.g.clues:
+            stats = self.clues.setdefault(clue, Stats())
+            clue.validate = self.wrap(clue.validate, stats)
+            for rule in clue.rules:
+                self.attach_rule(rule)
+
+    def attach_rule(self: Profiler, rule: Rule) -> None:
+        stats = self.rules.setdefault(rule, Stats())
+        self.saved[rule] = rule.func
+        rule.func = self.wrap(rule.func, stats)
+        for r in rule.subrules:
+            self.attach_rule(r)
+
+    def detach(self: Profiler) -> None:
+        for clue in self.g.clues:
+            del clue.validate
+        for (rule, func) in self.saved.items():
+            rule.func = func
+        self.saved = {}
+        self.g.checker = self.checker
+
+    def __enter__(self: Profiler) -> Profiler:
+        self.attach()
+        return self
+
+    def __exit__(self: Profiler, *_) -> None:
+        self.detach()
+
+    def get_rank(self: Profiler, stats: Stats) -> float:
+        """
+        Cost per rejection: checking conjuncts in ascending rank minimizes the
+        expected cost of rejecting a world. Unmeasured and never failing
+        checks go last.
+        """
+        if not stats.failed:
+            return math.inf
+        return stats.seconds / stats.failed
+
+    def estimate_clue(self: Profiler, clue: Clue) -> Stats:
+        """
+        Estimate what a Clue's stats would have been with its rules in their
+        current order, taking the rules to pass independently of each other.
+        """
+        estimate = Stats()
+        estimate.evaluations, reached = 1, 1.0
+        for r in clue.rules:
+            stats = self.rules.get(r, Stats())
+            if stats.evaluations:
+                estimate.seconds += reached * stats.get_cost()
+                reached *= stats.passed / stats.evaluations
+        estimate.passed = reached
+        return estimate
+
+    def reorder(self: Profiler) -> None:
+        """
+        Sort the rules of each Clue, and then the Clues, by ascending measured
+        rank. Rules and clues are conjunctions, so only the cost changes.
+        """
+        for clue in self.g.clues:
+            clue.rules.sort(key=lambda r: self.get_rank(self.rules.get(r, Stats())))
+        self.g.clues.sort(key=lambda c: self.get_rank(self.estimate_clue(c)))
+
+    def get_clue_stats(self: Profiler, clue: Clue) -> Stats:
+        """
+        The stats of a Clue. Engines that check rules as soon as their kinds
+        are assigned (backtrack, planned, bitset) never call Clue.validate,
+        so then these are the sums over its rules: every rule evaluation
+        counts, and every rule failure is a rejection.
+        """
+        stats = self.clues.get(clue, Stats())
+        if stats.evaluations:
+            return stats
+
+        total = Stats()
+        for r in clue.rules:
+            rule = self.rules.get(r, Stats())
+            total.evaluations += rule.evaluations
+            total.passed += rule.passed
+            total.seconds += rule.seconds
+        return total
+
+    def to_json(self: Profiler) -> list[dict[str, object]]:
+        """Return the stats of every clue, in the current clue order, with its rules nested."""
+        def _rule(r: Rule) -> dict[str, object]:
+            return {
+                'rule': str(r),
+                **self.rules.get(r, Stats()).to_json(),
+                'subrules': list(_rule(sub) for sub in r.subrules),
+            }
+
+        return list({
+            'clue': i + 1,
+            **self.get_clue_stats(clue).to_json(),
+            'rules': list(_rule(r) for r in clue.rules),
+        } for (i, clue) in enumerate(self.g.clues))
+
+    def table(self: Profiler) -> str:
+        """Return the stats as a text table, rules indented under their clue."""
+        lines = [f'{"clue":>4}  {"rule":50} {"evals":>10} {"fail %":>7} {"total ms":>9} {"us/eval":>8}']
+
+        def _line(label: str, name: str, stats: Stats) -> None:
+            lines.append(f'{label:>4}  {name[:50]:50} {stats.evaluations:>10} '
+                         f'{stats.get_rejection_rate() * 100:>7.1f} {stats.seconds * 1000:>9.2f} '
+                         f'{stats.get_cost() * 1e6:>8.2f}')
+
+        def _rule(r: Rule, depth: int) -> None:
+            _line('', '  ' * depth + str(r), self.rules.get(r, Stats()))
+            for sub in r.subrules:
+                _rule(sub, depth + 1)
+
+        for (i, clue) in enumerate(self.g.clues):
+            _line(str(i + 1), '(all rules)', self.get_clue_stats(clue))
+            for r in clue.rules:
+                _rule(r, 1)
+
+        return '\n'.join(lines)
@@ -0,0 +1,470 @@
+"""
+A SAT engine. The Game is encoded as a boolean formula in conjunctive
+normal form and solved with a small CDCL solver, with no dependencies.
+
+There is a variable for each Thing of a kind after the first and each row
+(Thing of the first kind), true iff the Thing is in that row. Each row has
+exactly one Thing of each kind, and each Thing is in at most one row:
+exactly one, unless its kind has more things than there are rows. A Symbol
+A::Kind resolves to c iff A and c share a row, and to None if A is in no
+row, so every Rule can be written over these variables: link and same
+directly, and sorting, adjacency and math by checking the predicate on
+every combination of Things its Symbols could resolve to (these fail on
+None, which the other engines cannot evaluate them on at all). Boolean
+operators are encoded with auxiliary variables (Tseitin).
+
+Every solution is found by adding a clause that blocks each one found.
+Solutions are yielded in the same format as the other engines, but in the
+order the solver finds them.
+"""
+from __future__ import annotations
+import itertools
+from typing import Callable, Iterator
+from thing import Thing, ThingSort
+from game import Game, Rule, Symbol
+from compiler import ADJACENCY, MATH
+
+SORTS = {
+    '<': ThingSort.are_ascending,
+    '>': ThingSort.are_descending,
+    '<=': ThingSort.are_ascending_or_equal,
+    '>=': ThingSort.are_descending_or_equal,
+    '<A': ThingSort.are_ascending_alpha,
+    '>A': ThingSort.are_descending_alpha,
+    '<=A': ThingSort.are_ascending_or_equal_alpha,
+    '>=A': ThingSort.are_descending_or_equal_alpha,
+}
+
+# A literal is a variable number, negative for its negation
+Clause = list[int]
+
+class Solver:
+    """
+    A CDCL SAT solver: two watched literals, first UIP clause learning,
+    activity-based branching with phase saving, and restarts.
+    """
+    n_vars: int
+    values: list[int]
+    levels: list[int]
+    reasons: list[Clause|None]
+    activity: list[float]
+    phases: list[int]
+    watches: dict[int, list[Clause]]
+    trail: list[int]
+    limits: list[int]
+    head: int
+    increment: float
+    unsatisfiable: bool
+
+    def __init__(self: Solver) -> None:
+        self.n_vars = 0
+        self.values, self.levels, self.reasons = [0], [0], [None]
+        self.activity, self.phases = [0.0], [-1]
+        self.watches = {}
+        self.trail, self.limits, self.head = [], [], 0
+        self.increment = 1.0
+        self.unsatisfiable = False
+
+    def new_var(self: Solver) -> int:
+        self.n_vars += 1
+        self.values.append(0)
+        self.levels.append(0)
+        self.reasons.append(None)
+        self.activity.append(0.0)
+        self.phases.append(-1)
+        self.watches[self.n_vars], self.watches[-self.n_vars] = [], []
+        return self.n_vars
+
+    def value(self: Solver, lit: int) -> int:
+        """1 if the literal is true, -1 if it is false, 0 if it is unassigned."""
+        v = self.values[abs(lit)]
+        return v if lit > 0 else -v
+
+    def assign(self: Solver, lit: int, reason: Clause|None) -> None:
+        v = abs(lit)
+        self.values[v] = 1 if lit > 0 else -1
+        self.levels[v] = len(self.limits)
+        self.reasons[v] = reason
+        self.trail.append(lit)
+
+    def add_clause(self: Solver, clause: Clause) -> None:
+        """Add a clause between searches, i.e. at decision level 0."""
+        if self.unsatisfiable:
+            return
+        self.backtrack(0)
+
+        lits = []
+        for lit in dict.fromkeys(clause):
+            if -lit in lits or self.value(lit) > 0:
+                return
+            if self.value(lit) == 0:
+                lits.append(lit)
+
+        if not lits:
+            self.unsatisfiable = True
+        elif len(lits) == 1:
+            self.assign(lits[0], None)
+            if self.propagate() is not None:
+                self.unsatisfiable = True
+        else:
+            self.watch(lits)
+
+    def watch(self: Solver, clause: Clause) -> None:
+        self.watches[clause[0]].append(clause)
+        self.watches[clause[1]].append(clause)
+
+    def propagate(self: Solver) -> Clause|None:
+        """Assign every literal implied by unit clauses. Return a conflicting clause, if any."""
+        while self.head < len(self.trail):
+            false = -self.trail[self.head]
+            self.head += 1
+
+            watching, self.watches[false] = self.watches[false], []
+            for (i, clause) in enumerate(watching):
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], clause[0]
+
+                if self.value(clause[0]) > 0:
+                    self.watches[false].append(clause)
+                    continue
+
+                for k in range(2, len(clause)):
+                    if self.value(clause[k]) >= 0:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches[clause[1]].append(clause)
+                        break
+                else:
+                    self.watches[false].append(clause)
+                    if self.value(clause[0]) < 0:
+                        self.watches[false].extend(watching[i + 1:])
+                        return clause
+                    self.assign(clause[0], clause)
+
+        return None
+
+    def analyze(self: Solver, conflict: Clause) -> tuple[Clause, int]:
+        """Return the first UIP clause learnt from the conflict and the level to go back to."""
+        seen = set()
+        learnt = [0]
+        pending = 0
+        index = len(self.trail) - 1
+        lit = None
+        level = len(self.limits)
+
+        while True:
+            for q in (conflict if lit is None else conflict[1:]):
+                v = abs(q)
+                if v not in seen and self.levels[v] > 0:
+                    seen.add(v)
+                    self.bump(v)
+                    if self.levels[v] == level:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            lit = self.trail[index]
+            index -= 1
+            conflict = self.reasons[abs(lit)]
+            pending -= 1
+            if not pending:
+                break
+
+        learnt[0] = -lit
+        if len(learnt) == 1:
+            return (learnt, 0)
+
+        # Watch the literal of the highest remaining level second
+        i = max(range(1, len(learnt)), key=lambda i: self.levels[abs(learnt[i])])
+        learnt[1], learnt[i] = learnt[i], learnt[1]
+        return (learnt, self.levels[abs(learnt[1])])
+
+    def bump(self: Solver, v: int) -> None:
+        self.activity[v] += self.increment
+        if self.activity[v] > 1e100:
+            self.activity = list(a * 1e-100 for a in self.activity)
+            self.increment *= 1e-100
+
+    def backtrack(self: Solver, level: int) -> None:
+        if len(self.limits) <= level:
+            return
+        for lit in self.trail[self.limits[level]:]:
+            v = abs(lit)
+            self.phases[v] = self.values[v]
+            self.values[v] = 0
+            self.reasons[v] = None
+        del self.trail[self.limits[level]:]
+        del self.limits[level:]
+        self.head = len(self.trail)
+
+    def pick(self: Solver) -> int|None:
+        """The unassigned variable of highest activity, or None if there is none."""
+        best, chosen = -1.0, None
+        for v in range(1, self.n_vars + 1):
+            if not self.values[v] and self.activity[v] > best:
+                best, chosen = self.activity[v], v
+        return chosen
+
+    def solve(self: Solver) -> bool:
+        """Search for a model. If there is one, the values hold it until the next call."""
+        if self.unsatisfiable:
+            return False
+        self.backtrack(0)
+
+        conflicts, restart = 0, 100
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if not self.limits:
+                    self.unsatisfiable = True
+                    return False
+
+                learnt, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learnt) == 1:
+                    self.assign(learnt[0], None)
+                else:
+                    self.watch(learnt)
+                    self.assign(learnt[0], learnt)
+                self.increment /= 0.95
+
+                conflicts += 1
+                if conflicts >= restart:
+                    conflicts, restart = 0, int(restart * 1.5)
+                    self.backtrack(0)
+                continue
+
+            v = self.pick()
+            if v is None:
+                return True
+            self.limits.append(len(self.trail))
+            self.assign(v * self.phases[v], None)
+
+class SatGame:
+    g: Game
+    groups: list[list[Thing]]
+    n: int
+    solver: Solver
+    true: int
+    rows: dict[Thing, list[int]]
+    cache: dict[tuple, int]
+
+    def __init__(self: SatGame, g: Game) -> None:
+        self.g = g
+        self.groups = list(g.sets.values())
+        self.n = len(self.groups[0])
+        if any(len(group) < self.n for group in self.groups):
+            raise ValueError('The SAT engine needs every kind to have at least as many things as the first kind')
+
+        self.solver = Solver()
+        self.true = self.solver.new_var()
+        self.solver.add_clause([self.true])
+        self.cache = {}
+
+        # Things of the first kind define the rows
+        self.rows = {}
+        for (r, t) in enumerate(self.groups[0]):
+            self.rows[t] = list(self.true if i == r else -self.true for i in range(self.n))
+        for group in self.groups[1:]:
+            for t in group:
+                self.rows[t] = list(self.solver.new_var() for _ in range(self.n))
+
+        for group in self.groups[1:]:
+            for t in group:
+                if len(group) == self.n:
+                    self.add_exactly_one(self.rows[t])
+                else:
+                    self.add_at_most_one(self.rows[t])
+            for r in range(self.n):
+                self.add_exactly_one(list(self.rows[t][r] for t in group))
+
+        for clue in g.clues:
+            for rule in clue.rules:
+                self.add_rule(rule)
+
+    def add_at_most_one(self: SatGame, lits: list[int]) -> None:
+        for (a, b) in itertools.combinations(lits, 2):
+            self.solver.add_clause([-a, -b])
+
+    def add_exactly_one(self: SatGame, lits: list[int]) -> None:
+        self.solver.add_clause(lits)
+        self.add_at_most_one(lits)
+
+    def conjoin(self: SatGame, lits: list[int]) -> int:
+        """A literal that is true iff every literal is."""
+        if -self.true in lits:
+            return -self.true
+        lits = sorted(set(lit for lit in lits if lit != self.true))
+        if not lits:
+            return self.true
+        if len(lits) == 1:
+            return lits[0]
+
+        key = ('and', *lits)
+        if key not in self.cache:
+            z = self.solver.new_var()
+            for lit in lits:
+                self.solver.add_clause([-z, lit])
+            self.solver.add_clause([z] + list(-lit for lit in lits))
+            self.cache[key] = z
+        return self.cache[key]
+
+    def disjoin(self: SatGame, lits: list[int]) -> int:
+        """A literal that is true iff any literal is."""
+        return -self.conjoin(list(-lit for lit in lits))
+
+    def exactly_one(self: SatGame, lits: list[int]) -> int:
+        at_most_one = list(-self.conjoin([a, b]) for (a, b) in itertools.combinations(lits, 2))
+        return self.conjoin([self.disjoin(lits)] + at_most_one)
+
+    def share_row(self: SatGame, a: Thing, b: Thing) -> int:
+        """A literal that is true iff a and b are in the same row."""
+        if a is b:
+            return self.true
+        if a.kind_index == b.kind_index:
+            return -self.true
+        return self.disjoin(list(self.conjoin([x, y]) for (x, y) in zip(self.rows[a], self.rows[b])))
+
+    def is_placed(self: SatGame, t: Thing) -> int:
+        """A literal that is true iff t is in a row, which only Things of kinds with more things than rows may not be."""
+        if len(self.groups[t.kind_index]) == self.n:
+            return self.true
+        return self.disjoin(self.rows[t])
+
+    def resolves(self: SatGame, s: Symbol) -> int:
+        """
+        A literal that is true iff the Symbol resolves to a Thing rather than
+        None. A Thing is always related to itself, so only a path that leaves
+        its kind needs it to be in a row.
+        """
+        if all(k == s.thing.kind_index for k in s.path):
+            return self.true
+        return self.is_placed(s.thing)
+
+    @staticmethod
+    def get_kind(s: Symbol) -> int:
+        return s.path[-1] if s.path else s.thing.kind_index
+
+    def get_candidates(self: SatGame, s: Symbol) -> list[Thing]:
+        return self.groups[self.get_kind(s)] if s.path else [s.thing]
+
+    def resolves_to(self: SatGame, s: Symbol, c: Thing) -> int:
+        """
+        A literal that is true iff the Symbol resolves to c. Every Thing along
+        a path shares the row of the first, so A::...::Kind is the Thing of
+        that Kind in A's row.
+        """
+        if c.kind_index != self.get_kind(s):
+            return -self.true
+        if c.kind_index != s.thing.kind_index:
+            return self.share_row(s.thing, c)
+        return self.resolves(s) if c is s.thing else -self.true
+
+    def get_predicate(self: SatGame, r: Rule, base: str) -> Callable[[list[Thing]], bool]:
+        if base in SORTS:
+            return SORTS[base]
+        if base in ADJACENCY:
+            return ADJACENCY[base]
+        if base in MATH:
+            expected = float(r.json['args'][0])
+            return lambda ts: MATH[base](expected, ts)
+        raise ValueError(f'Unknown function: {r.json["func"]}')
+
+    def get_combinations(self: SatGame, r: Rule, base: str, negate: bool) -> Iterator[list[int]]:
+        """For every combination of Things the Symbols may resolve to, yield its literals if the Rule holds there."""
+        predicate = self.get_predicate(r, base)
+        for things in itertools.product(*(self.get_candidates(s) for s in r.symbols)):
+            if predicate(list(things)) != negate:
+                yield list(self.resolves_to(s, t) for (s, t) in zip(r.symbols, things))
+
+    def encode(self: SatGame, r: Rule) -> int:
+        """A literal that is true iff the Rule holds."""
+        f = r.json['func']
+
+        match f:
+            case 'and':
+                return self.conjoin(list(self.encode(sub) for sub in r.subrules))
+            case 'or':
+                return self.disjoin(list(self.encode(sub) for sub in r.subrules))
+            case 'xor':
+                return self.exactly_one(list(self.encode(sub) for sub in r.subrules))
+            case 'nand':
+                return -self.conjoin(list(self.encode(sub) for sub in r.subrules)) if r.subrules else -self.true
+            case 'nor' | 'not' | '!':
+                return -self.disjoin(list(self.encode(sub) for sub in r.subrules))
+
+        negate = f.startswith('!')
+        base = f[1:] if negate else f
+
+        match base:
+            case 'link':
+                # Things of different kinds are linked iff they share a row,
+                # and Things of the same kind iff they are the same Thing
+                pairs = []
+                for (a, b) in itertools.combinations(r.symbols, 2):
+                    if self.get_kind(a) != self.get_kind(b):
+                        pairs.append(self.share_row(a.thing, b.thing))
+                    else:
+                        pairs.append(self.same([a, b]))
+                lit = self.disjoin(pairs)
+            case 'same':
+                # As interpreted: no Things are neither all the same nor different
+                if not r.symbols:
+                    return -self.true
+                lit = self.same(r.symbols)
+            case _:
+                # Both the rule and its negation need every Symbol resolved
+                return self.disjoin(list(self.conjoin(lits) for lits in self.get_combinations(r, base, negate)))
+
+        return -lit if negate else lit
+
+    def same(self: SatGame, symbols: list[Symbol]) -> int:
+        if len(symbols) < 2:
+            return self.true
+        matches = list(self.conjoin(list(self.resolves_to(s, c) for s in symbols)) for c in self.get_candidates(symbols[0]))
+        # Symbols that all resolve to None are the same too
+        matches.append(self.conjoin(list(-self.resolves(s) for s in symbols)))
+        return self.disjoin(matches)
+
+    def add_rule(self: SatGame, r: Rule) -> None:
+        """
+        Require the Rule to hold. Sorting, adjacency and math rules forbid each
+        combination where they fail with one clause instead of an encoding,
+        and require each Symbol to resolve.
+        """
+        f = r.json['func']
+        negate = f.startswith('!') and f != '!'
+        base = f[1:] if negate else f
+
+        if f == 'and':
+            for sub in r.subrules:
+                self.add_rule(sub)
+        elif base in SORTS or base in ADJACENCY or base in MATH:
+            for lits in self.get_combinations(r, base, not negate):
+                self.solver.add_clause(list(-lit for lit in lits))
+            for s in r.symbols:
+                if self.resolves(s) != self.true:
+                    self.solver.add_clause([self.resolves(s)])
+        else:
+            self.solver.add_clause([self.encode(r)])
+
+    def get_solution(self: SatGame) -> list[list[Thing]]:
+        rows = list([t] for t in self.groups[0])
+        for group in self.groups[1:]:
+            for t in group:
+                r = next((r for (r, lit) in enumerate(self.rows[t]) if self.solver.value(lit) > 0), None)
+                if r is not None:
+                    rows[r].append(t)
+        return rows
+
+    def block(self: SatGame, solution: list[list[Thing]]) -> None:
+        """Forbid the solution, so that the next one found is another."""
+        self.solver.add_clause(list(-self.rows[t][r] for (r, row) in enumerate(solution) for t in row[1:]))
+
+def iter_solutions(g: Game) -> Iterator[list[list[Thing]]]:
+    sg = SatGame(g)
+    while sg.solver.solve():
+        solution = sg.get_solution()
+        yield solution
+        sg.block(solution)
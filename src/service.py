@@ -0,0 +1,292 @@
+"""
+A local solver service. Clients connect over TCP and send requests as JSON
+lines; each request is answered with a stream of JSON lines:
+
+    {"game": {...}, "engine": "backtrack", "limit": null, "id": 1}
+
+    {"event": "accepted", "key": "...", "coalesced": false, "id": 1}
+    {"event": "solution", "solution": [["Anthony", "Bernadette", ...], ...], "id": 1}
+    {"event": "done", "count": 1, "seconds": 0.12, "id": 1}
+
+The game has the same schema as a game file. Only engine and id are
+optional. A failed request ends with {"event": "error", "error": "..."}
+instead of done.
+
+Jobs wait in a bounded queue for one of a fixed number of worker slots,
+and a request is refused at once when the queue is full. Each job runs in a
+fresh worker process, which streams its solutions back as it finds them
+and is killed if the job runs past its timeout. Concurrent requests for
+the same game, by its canonical hash (see cache.py), engine and limit,
+share one job: a later request is first sent what was found so far.
+
+    python src/service.py --port 8765 --processes 2
+    python src/service.py --client src/games/valentine.json --port 8765
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import AsyncIterator
+from game import Game
+import cache
+import solve
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE = 16
+DEFAULT_TIMEOUT = 60.0
+
+# Requests and games can be long lines
+LINE_LIMIT = 16 * 1024 * 1024
+
+class Job:
+    """One solve and the listeners waiting for its events."""
+    key: str
+    request: dict[str, object]
+    events: list[dict[str, object]]
+    listeners: list[asyncio.Queue]
+    done: bool
+
+    def __init__(self: Job, key: str, request: dict[str, object]) -> None:
+        self.key = key
+        self.request = request
+        self.events = []
+        self.listeners = []
+        self.done = False
+
+    def subscribe(self: Job) -> asyncio.Queue:
+        """Return a queue of every event of the job, starting with those already published."""
+        listener = asyncio.Queue()
+        for event in self.events:
+            listener.put_nowait(event)
+        self.listeners.append(listener)
+        return listener
+
+    def unsubscribe(self: Job, listener: asyncio.Queue) -> None:
+        self.listeners.remove(listener)
+
+    def publish(self: Job, event: dict[str, object]) -> None:
+        if self.done:
+            return
+        self.events.append(event)
+        self.done = event['event'] in {'done', 'error'}
+        for listener in self.listeners:
+            listener.put_nowait(event)
+
+class Service:
+    processes: int
+    capacity: int
+    timeout: float
+    queue: asyncio.Queue[Job]
+    jobs: dict[str, Job]
+    workers: list[asyncio.Task]
+    handlers: set[asyncio.Task]
+    server: asyncio.Server|None
+
+    def __init__(self: Service, processes: int = 1, queue: int = DEFAULT_QUEUE, timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.processes = processes
+        self.capacity = queue
+        self.timeout = timeout
+        self.queue = asyncio.Queue()
+        self.jobs = {}
+        self.workers, self.handlers = [], set()
+        self.server = None
+
+    @staticmethod
+    def get_key(request: dict[str, object]) -> str:
+        """The key of identical jobs. Parsing the game also validates it."""
+        g = Game.parse_data(request['game'])
+        solve.check_engine(g, request['engine'])
+        return f'{cache.get_key(g)}:{request["engine"]}:{request["limit"]}'
+
+    def submit(self: Service, request: dict[str, object]) -> tuple[Job, bool]:
+        """
+        Return the job of the request and whether it was already running or
+        queued. Raise ValueError if the request is invalid or the queue is full.
+        """
+        key = self.get_key(request)
+        if key in self.jobs:
+            return self.jobs[key], True
+
+        # Every job is running or waiting, and only so many may wait
+        if len(self.jobs) >= self.processes + self.capacity:
+            raise ValueError('The job queue is full, try again later')
+
+        job = Job(key, request)
+        self.queue.put_nowait(job)
+        self.jobs[key] = job
+        return job, False
+
+    async def work(self: Service) -> None:
+        """Run queued jobs one at a time, forever."""
+        while True:
+            job = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.run(job), self.timeout)
+            except asyncio.TimeoutError:
+                job.publish({'event': 'error', 'error': f'Timed out after {self.timeout} seconds'})
+            except Exception as e:
+                job.publish({'event': 'error', 'error': f'{type(e).__name__}: {e}'})
+            finally:
+                self.jobs.pop(job.key, None)
+                self.queue.task_done()
+
+    async def run(self: Service, job: Job) -> None:
+        """Solve the job in a worker process, publishing each line it writes."""
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, __file__, '--worker',
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, limit=LINE_LIMIT,
+        )
+        try:
+            process.stdin.write(json.dumps(job.request).encode() + b'\n')
+            process.stdin.close()
+
+            count = 0
+            async for line in process.stdout:
+                event = json.loads(line)
+                if event['event'] == 'solution':
+                    count += 1
+                job.publish(event)
+
+            if await process.wait() != 0:
+                job.publish({'event': 'error', 'error': f'The worker exited with code {process.returncode}'})
+            job.publish({'event': 'done', 'count': count, 'seconds': time.perf_counter() - start})
+
+        finally:
+            # Also reached when the job is cancelled by its timeout
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    async def handle(self: Service, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer each request of a connection in turn."""
+        async def _send(event: dict[str, object], id: object) -> None:
+            writer.write(json.dumps(event | {'id': id}).encode() + b'\n')
+            await writer.drain()
+
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            async for line in reader:
+                id = None
+                try:
+                    request = json.loads(line)
+                    id = request.get('id')
+                    request = {
+                        'game': request['game'],
+                        'engine': request.get('engine', 'backtrack'),
+                        'limit': request.get('limit'),
+                    }
+                    (job, coalesced) = self.submit(request)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    await _send({'event': 'error', 'error': f'{type(e).__name__}: {e}'}, id)
+                    continue
+
+                await _send({'event': 'accepted', 'key': job.key, 'coalesced': coalesced}, id)
+                listener = job.subscribe()
+                try:
+                    while True:
+                        event = await listener.get()
+                        await _send(event, id)
+                        if event['event'] in {'done', 'error'}:
+                            break
+                finally:
+                    job.unsubscribe(listener)
+
+        except ConnectionError:
+            pass
+        finally:
+            self.handlers.discard(task)
+            writer.close()
+
+    async def start(self: Service, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.Server:
+        """Start the workers and begin accepting connections. Port 0 picks a free port."""
+        self.workers = list(asyncio.create_task(self.work()) for _ in range(self.processes))
+        self.server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        return self.server
+
+    async def close(self: Service) -> None:
+        """
+        Stop accepting connections, then cancel every connection and worker
+        and wait for them, which kills the worker process of a running job.
+        Jobs still waiting are dropped.
+        """
+        self.server.close()
+        for job in self.jobs.values():
+            job.publish({'event': 'error', 'error': 'The service is shutting down'})
+        self.jobs.clear()
+
+        tasks = [*self.handlers, *self.workers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def serve(self: Service, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        server = await self.start(host, port)
+        try:
+            await server.serve_forever()
+        finally:
+            await self.close()
+
+def work() -> None:
+    """Worker mode: solve the request read from stdin, writing an event line per solution."""
+    request = json.loads(sys.stdin.readline())
+    try:
+        g = Game.parse_data(request['game'])
+        g.optimize_clues()
+        g.compile_clues()
+        g.presolve()
+        for (i, world) in enumerate(solve.iter_solutions(g, request['engine'], progress=False)):
+            if request['limit'] is not None and i >= request['limit']:
+                break
+            solution = list(list(t.id for t in row) for row in world)
+            print(json.dumps({'event': 'solution', 'solution': solution}), flush=True)
+    except Exception as e:
+        print(json.dumps({'event': 'error', 'error': f'{type(e).__name__}: {e}'}), flush=True)
+
+async def request(game: dict[str, object], engine: str = 'backtrack', limit: int|None = None,
+                  host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> AsyncIterator[dict[str, object]]:
+    """Send one request to a running service and yield each event of the answer."""
+    (reader, writer) = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+    try:
+        writer.write(json.dumps({'game': game, 'engine': engine, 'limit': limit}).encode() + b'\n')
+        await writer.drain()
+        async for line in reader:
+            event = json.loads(line)
+            yield event
+            if event['event'] in {'done', 'error'}:
+                return
+    finally:
+        writer.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve solves over TCP as JSON lines.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--processes', type=int, default=1, help='worker processes')
+    parser.add_argument('--queue', type=int, default=DEFAULT_QUEUE, help='jobs that may wait for a worker')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds a job may run')
+    parser.add_argument('--client', type=Path, help='send this game file to a running service instead')
+    parser.add_argument('--engine', default='backtrack', choices=solve.ENGINES, help='engine (with --client)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        work()
+    elif args.client is not None:
+        async def _client() -> None:
+            game = json.loads(args.client.read_text())
+            async for event in request(game, args.engine, host=args.host, port=args.port):
+                print(json.dumps(event), flush=True)
+        asyncio.run(_client())
+    else:
+        service = Service(args.processes, args.queue, args.timeout)
+        asyncio.run(service.serve(args.host, args.port))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Snapshots of prepared games. Parsing a game file builds every Rule and
+Symbol, then preparing it sorts the clues, generates and compiles the
+checker and pre-solves the grid. A snapshot pickles the prepared Game and
+marshals the checker's code object, so that loading it skips all of that.
+
+Snapshots are kept in .cache/games/, one per game file, and are used only
+while the game file's contents, the Python version and the source of the
+modules that built the snapshot are unchanged, like .pyc files.
+
+Run this module to compare the startup time of each mode:
+
+    python src/snapshot.py
+"""
+from __future__ import annotations
+import builtins
+import functools
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import pickle
+import subprocess
+import sys
+import time
+from pathlib import Path
+from types import FunctionType
+from typing import Callable
+from game import Game
+
+# Bump when the snapshot format changes
+VERSION = 2
+
+MAGIC = b'EINSNAP\n'
+DEFAULT_PATH = Path('.cache/games/')
+
+# The modules whose code builds what a snapshot holds: the pickled Game and
+# Grid and the compiled checker. Editing any of them makes snapshots stale.
+SOURCES = ('thing.py', 'game.py', 'presolve.py', 'compiler.py', 'snapshot.py')
+
+def prepare(g: Game) -> None:
+    """Prepare a parsed Game for solving, as every solver entry point does."""
+    g.optimize_clues()
+    g.compile_clues()
+    g.presolve()
+
+@functools.cache
+def get_prefix() -> bytes:
+    """What every snapshot this version of the code can load starts with."""
+    sources = hashlib.sha256()
+    for name in SOURCES:
+        sources.update((Path(__file__).parent / name).read_bytes())
+    return MAGIC + VERSION.to_bytes(2, 'little') + importlib.util.MAGIC_NUMBER + sources.digest()
+
+def get_digest(source: bytes) -> bytes:
+    return hashlib.sha256(source).digest()
+
+def dumps(g: Game, source: bytes) -> bytes:
+    code = marshal.dumps(g.checker.__code__) if g.checker is not None else None
+    return get_prefix() + get_digest(source) + pickle.dumps((g, code), pickle.HIGHEST_PROTOCOL)
+
+def loads(data: bytes, source: bytes|None) -> Game:
+    """
+    Load a snapshot taken of the given game file contents, or of any version
+    of the file if source is None. Raise ValueError if it is stale.
+    """
+    prefix = get_prefix()
+    start = len(prefix) + hashlib.sha256().digest_size
+    if not data.startswith(prefix) or (source is not None and data[len(prefix):start] != get_digest(source)):
+        raise ValueError('The snapshot is stale or from another version')
+
+    (g, code) = pickle.loads(data[start:])
+    if code is not None:
+        import compiler
+        namespace = compiler.RuleCompiler(g).namespace
+        namespace['__builtins__'] = builtins
+        g.checker = FunctionType(marshal.loads(code), namespace)
+    return g
+
+def get_snapshot(path: Path, directory: Path = DEFAULT_PATH) -> Path:
+    digest = hashlib.sha256(str(path.resolve()).encode()).hexdigest()[:16]
+    return directory / f'{path.stem}-{digest}.snapshot'
+
+def load_game(path: Path, directory: Path = DEFAULT_PATH) -> Game:
+    """
+    Return the prepared Game of a game file, from its snapshot if that is
+    fresh, and otherwise by parsing and preparing it and taking a snapshot.
+    """
+    source = path.read_bytes()
+    snapshot = get_snapshot(path, directory)
+    try:
+        return loads(snapshot.read_bytes(), source)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        pass
+
+    g = Game.parse_data(json.loads(source))
+    prepare(g)
+
+    # Write to a temporary file first so that readers never see half a snapshot
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        temporary = snapshot.with_suffix(f'.{os.getpid()}.tmp')
+        temporary.write_bytes(dumps(g, source))
+        os.replace(temporary, snapshot)
+    except OSError:
+        pass
+
+    return g
+
+def load_previous(path: Path, directory: Path = DEFAULT_PATH) -> Game|None:
+    """
+    Return the Game of the game file as it was when its snapshot was last
+    taken, e.g. before its clues were edited, or None if there is none.
+    """
+    try:
+        return loads(get_snapshot(path, directory).read_bytes(), None)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        return None
+
+def time_startup(statement: str) -> float:
+    """The wall time of a fresh interpreter running the statement from the repo root."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', f'import sys; sys.path.insert(0, "src"); {statement}'], check=True)
+    return time.perf_counter() - start
+
+def time_call(f: Callable[[], object], n: int = 20) -> float:
+    """The best wall time of n calls."""
+    best = float('inf')
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == '__main__':
+    print('Fresh interpreter, best of 5:')
+    for (name, statement) in [
+        ('python', 'pass'),
+        ('import solve', 'import solve'),
+        ('import main', 'import main'),
+        ('import batch', 'import batch'),
+        ('import tabulate', 'import tabulate'),
+        ('import progressbar', 'import progressbar'),
+    ]:
+        print(f'  {name:20} {min(time_startup(statement) for _ in range(5)) * 1000:7.1f} ms')
+
+    print('\nLoading each game, best of 20:')
+    for path in sorted(Path('src/games/').glob('*.json')):
+        source = path.read_bytes()
+
+        def _parse() -> Game:
+            g = Game.parse_data(json.loads(source))
+            prepare(g)
+            return g
+
+        data = dumps(_parse(), source)
+        parsed = time_call(_parse)
+        loaded = time_call(lambda: loads(data, source))
+        print(f'  {path.stem:15} parse and prepare {parsed * 1000:6.2f} ms   '
+              f'snapshot {loaded * 1000:6.2f} ms   x{parsed / loaded:.1f}')
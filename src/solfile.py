@@ -0,0 +1,206 @@
+"""
+A compact binary file of solutions (or any worlds), written as they are
+found and read back through mmap, so that memory use does not grow with
+the number of solutions.
+
+The file starts with a magic number and a JSON header naming the kinds and
+their things, in the order the records use. Each record is then one world,
+as a fixed-width little-endian integer per kind after the first: the index
+of the permutation that pairs that kind's things with the first kind's, in
+the order of itertools.permutations. Record i is at a known offset, so any
+solution can be read directly by its number.
+"""
+from __future__ import annotations
+import json
+import math
+import mmap
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+from thing import Thing
+from game import Game
+
+MAGIC = b'EINSOL\x01\n'
+
+# A world: a row per Thing of the first kind, each row a Thing per kind
+World = list[list[Thing]]
+
+def rank(perm: list[int], n: int) -> int:
+    """The index of perm among the permutations of len(perm) of range(n), in lexicographic order."""
+    index = 0
+    remaining = list(range(n))
+    for (i, p) in enumerate(perm):
+        index += remaining.index(p) * math.perm(n - i - 1, len(perm) - i - 1)
+        remaining.remove(p)
+    return index
+
+def unrank(index: int, n: int, m: int) -> list[int]:
+    """The permutation of m of range(n) with the given index: the inverse of rank."""
+    perm = []
+    remaining = list(range(n))
+    for i in range(m):
+        (q, index) = divmod(index, math.perm(n - i - 1, m - i - 1))
+        perm.append(remaining.pop(q))
+    return perm
+
+class Layout:
+    """The kinds and things of a file, in its order, and the width of each field of a record."""
+    groups: list[list[Thing]]
+    positions: dict[Thing, int]
+    widths: list[int]
+    size: int
+
+    def __init__(self: Layout, groups: list[list[Thing]]) -> None:
+        self.groups = groups
+        self.positions = {t: i for group in groups for (i, t) in enumerate(group)}
+
+        rows = len(groups[0])
+        if any(len(group) < rows for group in groups):
+            raise ValueError('Every kind needs at least as many things as the first kind')
+
+        self.widths = list(max(1, (math.perm(len(group), rows) - 1).bit_length() + 7 >> 3) for group in groups[1:])
+        # Keep records non-empty so that they can be counted
+        self.size = max(1, sum(self.widths))
+
+    @staticmethod
+    def from_header(g: Game, header: dict[str, object]) -> Layout:
+        """The layout a header describes, with the Game's Things."""
+        groups = []
+        for (kind, ids) in header['kinds']:
+            if kind not in g.sets or set(ids) != set(t.id for t in g.sets[kind]):
+                raise ValueError(f'The file does not match the game: kind {kind!r} differs')
+            groups.append(list(g.keys[id] for id in ids))
+        if len(groups) != len(g.sets):
+            raise ValueError('The file does not match the game: the kinds differ')
+        return Layout(groups)
+
+    def get_header(self: Layout) -> dict[str, object]:
+        return {'kinds': list([group[0].kind, list(t.id for t in group)] for group in self.groups)}
+
+    def encode(self: Layout, world: World) -> bytes:
+        # Rows may come in any order, and the file's first kind need not be the Game's
+        by_first = {}
+        first_kind = self.groups[0][0].kind_index
+        for row in world:
+            for t in row:
+                if t.kind_index == first_kind:
+                    by_first[t] = row
+
+        record = bytearray()
+        for (group, width) in zip(self.groups[1:], self.widths):
+            kind = group[0].kind_index
+            perm = list(self.positions[next(t for t in by_first[f] if t.kind_index == kind)] for f in self.groups[0])
+            record += rank(perm, len(group)).to_bytes(width, 'little')
+
+        return bytes(record.ljust(self.size, b'\0'))
+
+    def decode(self: Layout, record: bytes) -> World:
+        """The world in Game order: a row per Thing of the Game's first kind, in kind order."""
+        rows = list([t] for t in self.groups[0])
+        offset = 0
+        for (group, width) in zip(self.groups[1:], self.widths):
+            index = int.from_bytes(record[offset:offset + width], 'little')
+            offset += width
+            for (row, p) in zip(rows, unrank(index, len(group), len(rows))):
+                row.append(group[p])
+
+        # Things are indexed in Game order, so this puts the Game's first kind first
+        for row in rows:
+            row.sort(key=lambda t: t.kind_index)
+        return sorted(rows, key=lambda row: row[0].index)
+
+class SolutionWriter:
+    """Write worlds to a file one by one. Use as a context manager."""
+    path: Path
+    layout: Layout
+    file: BinaryIO|None
+    count: int
+
+    def __init__(self: SolutionWriter, path: Path, groups: list[list[Thing]]) -> None:
+        self.path = path
+        self.layout = Layout(groups)
+        self.file = None
+        self.count = 0
+
+    def __enter__(self: SolutionWriter) -> SolutionWriter:
+        header = json.dumps(self.layout.get_header(), separators=(',', ':')).encode()
+        self.file = open(self.path, 'wb')
+        self.file.write(MAGIC + len(header).to_bytes(4, 'little') + header)
+        return self
+
+    def write(self: SolutionWriter, world: World) -> None:
+        self.file.write(self.layout.encode(world))
+        self.count += 1
+
+    def write_all(self: SolutionWriter, worlds: Iterable[World]) -> int:
+        for world in worlds:
+            self.write(world)
+        return self.count
+
+    def __exit__(self: SolutionWriter, *_) -> None:
+        self.file.close()
+        self.file = None
+
+class SolutionFile:
+    """
+    A file of worlds, read through mmap: len() is the number of worlds and
+    indexing decodes one, so it can stand in for a list of solutions.
+    """
+    path: Path
+    layout: Layout
+    offset: int
+    count: int
+    file: BinaryIO
+    map: mmap.mmap
+
+    def __init__(self: SolutionFile, path: Path, g: Game) -> None:
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f'{path} is empty')
+
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a solution file')
+
+        length = int.from_bytes(self.map[len(MAGIC):len(MAGIC) + 4], 'little')
+        self.offset = len(MAGIC) + 4 + length
+        try:
+            self.layout = Layout.from_header(g, json.loads(self.map[len(MAGIC) + 4:self.offset]))
+        except (ValueError, KeyError, TypeError):
+            self.close()
+            raise
+
+        self.count = (len(self.map) - self.offset) // self.layout.size
+
+    def __len__(self: SolutionFile) -> int:
+        return self.count
+
+    def __getitem__(self: SolutionFile, i: int) -> World:
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('solution index out of range')
+        start = self.offset + i * self.layout.size
+        return self.layout.decode(self.map[start:start + self.layout.size])
+
+    def __iter__(self: SolutionFile) -> Iterator[World]:
+        for i in range(self.count):
+            yield self[i]
+
+    def close(self: SolutionFile) -> None:
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self: SolutionFile) -> SolutionFile:
+        return self
+
+    def __exit__(self: SolutionFile, *_) -> None:
+        self.close()
+
+def write_solutions(path: Path, g: Game, worlds: Iterable[World]) -> int:
+    """Stream the worlds into a file in the Game's own order. Return how many there were."""
+    with SolutionWriter(path, list(g.sets.values())) as writer:
+        return writer.write_all(worlds)
@@ -1,44 +1,264 @@
-
 import itertools
+import math
+import random
+from typing import Iterable, Iterator
 from thing import Thing
 from game import Game
-import progressbar
+from presolve import Grid
+from profiler import Profiler
+
+def permutations(items: list[Thing], masks: list[int]|None = None) -> Iterator[tuple[Thing, ...]]:
+    """
+    Yield the permutations of the items in the same order as
+    itertools.permutations, but only those that put an item allowed by
+    masks[i] (a bitmask of item indices) at each position i. A prefix is
+    abandoned as soon as some later position has no unused item left.
+    """
+    if masks is None:
+        yield from itertools.permutations(items)
+        return
+
+    n = len(masks)
+    perm = [None] * n
+
+    def _extend(i: int, used: int) -> Iterator[tuple[Thing, ...]]:
+        if i == n:
+            yield tuple(perm)
+            return
+
+        free = masks[i] & ~used
+        while free:
+            bit = free & -free
+            free ^= bit
+            if all(masks[j] & ~(used | bit) for j in range(i + 1, n)):
+                perm[i] = items[bit.bit_length() - 1]
+                yield from _extend(i + 1, used | bit)
 
-def expand_worlds(worlds: list[list[list[Thing]]], items: set[Thing]):
+    yield from _extend(0, 0)
+
+def get_permutations(items: list[Thing], rows: list[list[Thing]], k: int, grid: Grid|None) -> Iterator[tuple[Thing, ...]]:
+    """
+    Yield the permutations of the items (the Things of one kind) to pair with
+    the rows, which hold k Things so far, never generating any that the
+    pre-solved grid rules out.
+    """
+    return permutations(items, None if grid is None else grid.get_masks(rows, k, items))
+
+def expand_worlds(worlds: Iterable[list[list[Thing]]], items: list[Thing], grid: Grid|None = None) -> Iterator[list[list[Thing]]]:
     for world in worlds:
-        for perm in itertools.permutations(items):        
-            expanded = []   
+        for perm in get_permutations(items, world, len(world[0]), grid):
+            expanded = []
             for (base, add) in zip(world, perm):
                 item = base[:] + [add]
                 expanded.append(item)
             yield expanded
 
-def get_all_worlds(g: Game) -> list[list[Thing]]:
+def get_all_worlds(g: Game) -> Iterator[list[list[Thing]]]:
+    """
+    Lazily yield every world. Each expansion step is a generator over the
+    previous one, so only one partial world per kind is alive at a time.
+    """
     first, *groups = list(g.sets.values())
-    worlds = [[[t] for t in first]]
+    worlds = iter([[[t] for t in first]])
 
     for group in groups:
-        worlds = list(w for w in expand_worlds(worlds, group))
+        worlds = expand_worlds(worlds, group, g.grid)
 
     return worlds
 
+def count_worlds(g: Game) -> int:
+    """
+    Return the number of worlds get_all_worlds yields without a pre-solved
+    grid: the number of orders of every kind after the first, multiplied.
+    With one, the grid skips permutations its masks rule out, so this is
+    an upper bound.
+    """
+    first, *groups = list(g.sets.values())
+    return math.prod(math.factorial(len(group)) for group in groups)
+
+def get_random_worlds(g: Game, n: int, seed: int = 0) -> Iterator[list[list[Thing]]]:
+    """Yield n worlds drawn uniformly at random (with replacement), reproducibly."""
+    rng = random.Random(seed)
+    first, *groups = list(g.sets.values())
+    for _ in range(n):
+        perms = list(rng.sample(group, len(group)) for group in groups)
+        yield list([t] + list(perm[r] for perm in perms) for (r, t) in enumerate(first))
+
 def realize_world(world: list[list[Thing]]) -> None:
     for group in world:
         first, *rest = group
         for t in rest:
             first.relate(t)
 
-def find_solutions(g: Game) -> list[list[Thing]]:
-    solutions = []
+def check_worlds(g: Game, worlds: Iterable[list[list[Thing]]]) -> Iterator[list[list[Thing]]]:
+    """
+    Yield the worlds that satisfy all the clues.
+    Closing the generator early (e.g. via break or islice) stops the search
+    and leaves the Things with fresh relationships.
+    """
+    g.reset_relationships()
+
+    try:
+        for world in worlds:
+            realize_world(world)
+
+            if g.validate_all_clues():
+                yield world
+
+            g.reset_relationships()
+
+    finally:
+        g.reset_relationships()
+
+def brute_force(g: Game, progress: bool = True) -> Iterator[list[list[Thing]]]:
+    """
+    Build every world and check all the clues against it, showing a progress
+    bar unless progress is False (progressbar is then not even imported).
+    """
+    worlds = get_all_worlds(g)
+    if progress:
+        import progressbar
+        worlds = progressbar.progressbar(worlds, max_value=count_worlds(g))
+    return check_worlds(g, worlds)
+
+def place(row: list[Thing], k: int, t: Thing) -> None:
+    """Put t in the row as its Thing of kind k, relating it to the rest of the row."""
+    row[k] = t
+    for other in row:
+        other.relationships[k] = t
+        t.relationships[other.kind_index] = other
+
+def incremental(g: Game) -> Iterator[list[list[Thing]]]:
+    """
+    Brute force, but moving from one world to the next only rewrites the
+    rows that changed. Successive permutations from itertools.permutations
+    usually differ in their last few positions, so this costs O(changed
+    rows * kinds) per world instead of realizing and resetting every Thing.
+    """
+    first, *groups = list(g.sets.values())
+    rows = list([t] + list(group[r] for group in groups) for (r, t) in enumerate(first))
 
     g.reset_relationships()
 
-    for world in progressbar.progressbar(get_all_worlds(g)):
-        realize_world(world)
+    try:
+        for row in rows:
+            for (k, t) in enumerate(row):
+                place(row, k, t)
+
+        yield from _expand(g, rows, groups, 1)
 
-        if g.validate_all_clues():
-            solutions.append(world)
-        
+    finally:
         g.reset_relationships()
-        
-    return solutions
+
+def _expand(g: Game, rows: list[list[Thing]], groups: list[list[Thing]], k: int) -> Iterator[list[list[Thing]]]:
+    last = k == len(groups)
+
+    for perm in get_permutations(groups[k - 1], rows, k, g.grid):
+        for (row, t) in zip(rows, perm):
+            if row[k] is not t:
+                place(row, k, t)
+
+        if not last:
+            yield from _expand(g, rows, groups, k + 1)
+
+        elif g.validate_all_clues():
+            yield list(row[:] for row in rows)
+
+ENGINES = ('brute', 'incremental', 'planned', 'backtrack', 'bitset', 'sat', 'numpy', 'parallel')
+
+# Engines that need every kind to have the same number of things
+UNIFORM_ENGINES = {'bitset', 'numpy'}
+
+def check_engine(g: Game, engine: str) -> None:
+    """
+    Raise ValueError if the engine cannot solve the Game, before any search
+    starts: if it is unknown, or it cannot take the sizes of the kinds. The
+    first kind's Things are the rows, so no kind can have fewer.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine: {engine} (expected one of {", ".join(ENGINES)})')
+
+    sizes = list(len(group) for group in g.sets.values())
+    if any(size < sizes[0] for size in sizes):
+        raise ValueError('Every kind needs at least as many things as the first kind')
+    if engine in UNIFORM_ENGINES and len(set(sizes)) > 1:
+        raise ValueError(f'The {engine} engine needs every kind to have the same number of things')
+
+# The number of random worlds profiled before adaptive reordering
+ADAPTIVE_SAMPLE = 1_000
+
+def adapt_clues(g: Game, engine: str, sample: int = ADAPTIVE_SAMPLE, progress: bool = True) -> Iterator[list[list[Thing]]]:
+    """
+    Search with the given engine, but first profile every rule over sample
+    random worlds and reorder the clues (and their rules) by measured cost
+    and rejection rate. Random worlds, since the first worlds of the search
+    only vary its last kinds. Compiled clues are recompiled in the new order.
+
+    This is a one-time pass before the search: the order is not adapted
+    again while the search runs. The engine only starts (and draws its
+    progress bar) once the clues are reordered.
+    """
+    def _search() -> Iterator[list[list[Thing]]]:
+        p = Profiler(g)
+        with p:
+            g.reset_relationships()
+            for world in get_random_worlds(g, sample):
+                realize_world(world)
+                # Evaluate every rule, so that each one's rejection rate is measured
+                # over the same worlds rather than only the worlds earlier rules passed
+                for clue in g.clues:
+                    for r in clue.rules:
+                        r.evaluate(g)
+                g.reset_relationships()
+
+        p.reorder()
+        if g.checker is not None:
+            g.compile_clues()
+
+        yield from iter_solutions(g, engine, progress=progress)
+
+    return _search()
+
+def iter_solutions(g: Game, engine: str = 'brute', adaptive: bool = False, progress: bool = True) -> Iterator[list[list[Thing]]]:
+    """
+    Yield each solution as soon as it is found by the given engine.
+    Every engine finds the same set of solutions. If adaptive, the clues
+    are first reordered by profiling a sample of worlds (see adapt_clues).
+    Only the brute force engine shows progress.
+    """
+    if adaptive:
+        return adapt_clues(g, engine, progress=progress)
+
+    match engine:
+        case 'brute':
+            return brute_force(g, progress)
+        case 'incremental':
+            return incremental(g)
+        case 'planned':
+            import planner
+            return planner.iter_solutions(g)
+        case 'backtrack':
+            import backtrack
+            return backtrack.iter_solutions(g)
+        case 'bitset':
+            import bitset
+            return bitset.iter_solutions(g)
+        case 'sat':
+            import sat
+            return sat.iter_solutions(g)
+        case 'numpy':
+            import vectorized
+            return vectorized.iter_solutions(g)
+        case 'parallel':
+            import parallel
+            return parallel.iter_solutions(g)
+
+    raise ValueError(f'Unknown engine: {engine} (expected one of {", ".join(ENGINES)})')
+
+def find_solutions(g: Game, limit: int|None = None, engine: str = 'brute',
+                   adaptive: bool = False, progress: bool = True) -> list[list[list[Thing]]]:
+    """
+    Return the solutions, stopping after limit of them if it is given.
+    For example, limit=1 finds any solution and limit=2 proves uniqueness.
+    """
+    return list(itertools.islice(iter_solutions(g, engine, adaptive, progress), limit))
@@ -1,49 +1,85 @@
 from __future__ import annotations
 import itertools
 import math
+from typing import Iterator
 
 class Thing:
+    """
+    A Thing is identified by its index, a small integer unique within its Game,
+    which is what hashing and equality use. Its relationships are a list with
+    one slot per kind, indexed by kind number; unrelated kinds hold None.
+    """
+    __slots__ = (
+        'id', 'kind', 'index', 'kind_index', 'relationships', 'fellows',
+        'value', 'key', 'rank', 'alpha_rank',
+    )
+
     id: str
     kind: str
-    relationships: dict[str, Thing]
-    fellows: set[Thing]
+    index: int
+    kind_index: int
+    relationships: list[Thing|None]
+    fellows: list[Thing]
+    value: int|None
+    key: str
+    rank: int|None
+    alpha_rank: int|None
 
-    def __init__(self: Thing, id: str, kind: str) -> None:
+    def __init__(self: Thing, id: str, kind: str, index: int, kind_index: int = 0, n_kinds: int = 1) -> None:
         self.id = id
         self.kind = kind
-        self.fellows = set()
+        self.index = index
+        self.kind_index = kind_index
+        self.fellows = []
+        self.relationships = [None] * n_kinds
         self.reset_relationships()
 
+        digits = ''.join(c for c in self.id if c.isdigit())
+        self.value = int(digits) if digits else None
+        self.key = self.id.casefold()
+        self.rank, self.alpha_rank = None, None
+
+    def rank_fellows(self: Thing) -> None:
+        """
+        Cache this Thing's index among its fellows sorted numerically
+        and alphabetically. Call once the fellows are set.
+        """
+        if all(t.value is not None for t in self.fellows):
+            self.rank = sorted(t.value for t in self.fellows).index(self.value)
+        self.alpha_rank = sorted(t.key for t in self.fellows).index(self.key)
+
     def __hash__(self: Thing) -> int:
-        return hash(str(self))
+        return self.index
     
     def __repr__(self: Thing) -> str:
         return f'{self.id}'
     
     def __eq__(self: Thing, other: Thing) -> bool:
-        return str(self) == str(other)
+        return self is other or (isinstance(other, Thing) and self.index == other.index)
     
     def relations(self: Thing) -> set[Thing]:
-        return set(self.relationships.values())
+        return set(t for t in self.relationships if t is not None)
     
     def reset_relationships(self: Thing) -> None:
-        self.relationships = {
-            self.kind: self
-        }
+        self.relationships = [None] * len(self.relationships)
+        self.relationships[self.kind_index] = self
 
-    def get(self: Thing, key: str) -> Thing:
-        return self.relationships.get(key)
+    def get(self: Thing, key: int) -> Thing|None:
+        return self.relationships[key]
     
-    def set(self: Thing, key: str, val: Thing) -> None:
+    def set(self: Thing, key: int, val: Thing) -> None:
         self.relationships[key] = val
 
+    def unset(self: Thing, key: int) -> None:
+        self.relationships[key] = None
+
     def relate(self: Thing, other: Thing) -> bool:
         things = set()
-        relationships = {}
+        relationships = [None] * len(self.relationships)
 
         def _compile(t: Thing) -> None:
-            for (k, t2) in t.relationships.items():
-                if t2 not in things:
+            for (k, t2) in enumerate(t.relationships):
+                if t2 is not None and t2 not in things:
                     things.add(t2)
                     relationships[k] = t2
                     _compile(t2)
@@ -52,8 +88,9 @@ class Thing:
         _compile(other)
 
         for t in things:
-            for (k, t2) in relationships.items():
-                t.set(k, t2)
+            for (k, t2) in enumerate(relationships):
+                if t2 is not None:
+                    t.set(k, t2)
 
     @staticmethod
     def are_linked(ts: list[Thing]) -> bool:
@@ -66,15 +103,17 @@ class Thing:
         False is returned iff no item is linked with any other.
         """
         for (t1, t2) in itertools.combinations(ts, 2):
-            if (t1.get(t2.kind) is t2) and (t2.get(t1.kind) is t1):
+            if (t1.relationships[t2.kind_index] is t2) and (t2.relationships[t1.kind_index] is t1):
                 return True
         return False
 
     def get_numerical_value(self: Thing) -> int:
-        return int(''.join(c for c in self.id if c.isdigit()))
+        if self.value is None:
+            raise ValueError(f'{self.id!r} has no numerical value')
+        return self.value
 
-    def get_alphabetical_value(self: Thing) -> int:
-        return ''.join(c.casefold() for c in self.id)
+    def get_alphabetical_value(self: Thing) -> str:
+        return self.key
 
 class ThingMath:
     epsilon: float = 0.001
@@ -85,7 +124,12 @@ class ThingMath:
     
     @staticmethod
     def get_numerical_values(ts: list[Thing]) -> list[int]:
-        return list(t.get_numerical_value() for t in ts)
+        """Raise the ValueError of Thing.get_numerical_value if any Thing has none."""
+        nums = list(t.value for t in ts)
+        if None in nums:
+            for t in ts:
+                t.get_numerical_value()
+        return nums
 
     @staticmethod
     def sum_is(expected: int|float, ts: list[Thing]) -> bool:
@@ -93,9 +137,10 @@ class ThingMath:
 
     @staticmethod
     def difference_is(expected: int|float, ts: list[Thing]) -> bool:
-        result = ts[0].get_numerical_value()
-        for t in ts[1:]:
-            result -= t.get_numerical_value()
+        values = ThingMath.get_numerical_values(ts)
+        result = values[0]
+        for v in values[1:]:
+            result -= v
 
         return ThingMath.is_near(expected, result)
 
@@ -105,9 +150,10 @@ class ThingMath:
 
     @staticmethod
     def quotient_is(expected: int|float, ts: list[Thing]) -> bool:
-        result = ts[0].get_numerical_value()
-        for t in ts[1:]:
-            result /= t.get_numerical_value()
+        values = ThingMath.get_numerical_values(ts)
+        result = values[0]
+        for v in values[1:]:
+            result /= v
 
         return ThingMath.is_near(expected, result)
 
@@ -116,7 +162,7 @@ class ThingSort:
     @staticmethod
     def are_ascending(ts: list[Thing]) -> bool:
         """Strict: every item must actually be lt the next."""
-        nums = list(t.get_numerical_value() for t in ts)
+        nums = ThingMath.get_numerical_values(ts)
         for i in range(len(nums) - 1):
             if not (nums[i] < nums[i + 1]):
                 return False
@@ -124,7 +170,7 @@ class ThingSort:
     
     @staticmethod
     def are_ascending_or_equal(ts: list[Thing]) -> bool:
-        nums = list(t.get_numerical_value() for t in ts)
+        nums = ThingMath.get_numerical_values(ts)
         for i in range(len(nums) - 1):
             if not (nums[i] <= nums[i + 1]):
                 return False
@@ -133,7 +179,7 @@ class ThingSort:
     @staticmethod
     def are_descending(ts: list[Thing]) -> bool:
         """Strict: every item must actually be gt the next."""
-        nums = list(t.get_numerical_value() for t in ts)
+        nums = ThingMath.get_numerical_values(ts)
         for i in range(len(nums) - 1):
             if not (nums[i] > nums[i + 1]):
                 return False
@@ -141,7 +187,7 @@ class ThingSort:
     
     @staticmethod
     def are_descending_or_equal(ts: list[Thing]) -> bool:
-        nums = list(t.get_numerical_value() for t in ts)
+        nums = ThingMath.get_numerical_values(ts)
         for i in range(len(nums) - 1):
             if not (nums[i] >= nums[i + 1]):
                 return False
@@ -182,67 +228,69 @@ class ThingSort:
         return True
 
     @staticmethod
-    def are_adjacent(ts: list[Thing]) -> bool:
+    def get_ranks(ts: list[Thing]) -> Iterator[int]:
+        """
+        Yield each Thing's index in the numerically sorted fellows of the first Thing.
+        These are cached, unless the Things are of different kinds or not all numerical.
+        """
+        fellows = ts[0].fellows
+        if all(t.fellows is fellows for t in ts):
+            ranks = list(t.rank for t in ts)
+            if None not in ranks:
+                return iter(ranks)
+
         nums = list(t.get_numerical_value() for t in ts)
-        nums_ordered = sorted(list(t.get_numerical_value() for t in ts[0].fellows))
-        for i in range(len(nums) - 1):
-            ia = nums_ordered.index(nums[i])
-            ib = nums_ordered.index(nums[i + 1])
+        ordered = sorted(t.get_numerical_value() for t in fellows)
+        return (ordered.index(n) for n in nums)
+
+    @staticmethod
+    def get_alpha_ranks(ts: list[Thing]) -> Iterator[int]:
+        """As get_ranks, but sorted alphabetically."""
+        fellows = ts[0].fellows
+        if all(t.fellows is fellows for t in ts):
+            return iter(list(t.alpha_rank for t in ts))
+
+        ordered = sorted(t.key for t in fellows)
+        return (ordered.index(t.key) for t in ts)
+
+    @staticmethod
+    def are_adjacent(ts: list[Thing]) -> bool:
+        for (ia, ib) in itertools.pairwise(ThingSort.get_ranks(ts)):
             if abs(ia - ib) > 1:
                 return False
         return True
 
     @staticmethod
     def are_adjacent_ascending(ts: list[Thing]) -> bool:
-        nums = list(t.get_numerical_value() for t in ts)
-        nums_ordered = sorted(list(t.get_numerical_value() for t in ts[0].fellows))
-        for i in range(len(nums) - 1):
-            ia = nums_ordered.index(nums[i])
-            ib = nums_ordered.index(nums[i + 1])
+        for (ia, ib) in itertools.pairwise(ThingSort.get_ranks(ts)):
             if (ib - ia) != 1:
                 return False
         return True
-    
+
     @staticmethod
     def are_adjacent_descending(ts: list[Thing]) -> bool:
-        nums = list(t.get_numerical_value() for t in ts)
-        nums_ordered = sorted(list(t.get_numerical_value() for t in ts[0].fellows))
-        for i in range(len(nums) - 1):
-            ia = nums_ordered.index(nums[i])
-            ib = nums_ordered.index(nums[i + 1])
+        for (ia, ib) in itertools.pairwise(ThingSort.get_ranks(ts)):
             if (ia - ib) != 1:
                 return False
         return True
 
     @staticmethod
     def are_adjacent_alpha(ts: list[Thing]) -> bool:
-        vals = list(t.get_alphabetical_value() for t in ts)
-        vals_ordered = sorted(list(t.get_alphabetical_value() for t in ts[0].fellows))
-        for i in range(len(vals) - 1):
-            ia = vals_ordered.index(vals[i])
-            ib = vals_ordered.index(vals[i + 1])
+        for (ia, ib) in itertools.pairwise(ThingSort.get_alpha_ranks(ts)):
             if abs(ia - ib) > 1:
                 return False
         return True
 
     @staticmethod
     def are_adjacent_ascending_alpha(ts: list[Thing]) -> bool:
-        vals = list(t.get_alphabetical_value() for t in ts)
-        vals_ordered = sorted(list(t.get_alphabetical_value() for t in ts[0].fellows))
-        for i in range(len(vals) - 1):
-            ia = vals_ordered.index(vals[i])
-            ib = vals_ordered.index(vals[i + 1])
+        for (ia, ib) in itertools.pairwise(ThingSort.get_alpha_ranks(ts)):
             if (ib - ia) != 1:
                 return False
         return True
-    
+
     @staticmethod
     def are_adjacent_descending_alpha(ts: list[Thing]) -> bool:
-        vals = list(t.get_alphabetical_value() for t in ts)
-        vals_ordered = sorted(list(t.get_alphabetical_value() for t in ts[0].fellows))
-        for i in range(len(vals) - 1):
-            ia = vals_ordered.index(vals[i])
-            ib = vals_ordered.index(vals[i + 1])
+        for (ia, ib) in itertools.pairwise(ThingSort.get_alpha_ranks(ts)):
             if (ia - ib) != 1:
                 return False
         return True
@@ -0,0 +1,281 @@
+"""
+A vectorized engine. The Game is compiled into integer arrays: a world is
+one permutation per kind, giving the position (within its kind) of the Thing
+in each row. Whole batches of worlds are then checked at once with NumPy,
+so no Thing relationships are touched while searching.
+
+Worlds are numbered in the same order get_all_worlds produces them, so the
+solutions come out in the same order as the brute force engine.
+"""
+from __future__ import annotations
+import itertools
+import math
+from typing import Callable, Iterator
+import numpy as np
+from thing import Thing, ThingMath
+from game import Game, Rule, Symbol
+
+# A batch of worlds: for each kind, the Thing position at each row
+# and the row of each Thing position. Both are (worlds, rows) arrays.
+Batch = tuple[list[np.ndarray], list[np.ndarray]]
+
+# A resolved Symbol: its kind index, the Thing position and its row, per world
+Resolved = tuple[int, np.ndarray, np.ndarray]
+
+Check = Callable[[Batch], np.ndarray]
+
+class VectorGame:
+    g: Game
+    kinds: list[str]
+    groups: list[list[Thing]]
+    places: dict[Thing, tuple[int, int]]
+    perms: np.ndarray
+    inverses: np.ndarray
+    codes: list[np.ndarray]
+    values: dict[int, np.ndarray]
+    checks: list[Check]
+
+    def __init__(self: VectorGame, g: Game) -> None:
+        self.g = g
+        self.kinds = list(g.sets)
+        self.groups = list(list(s) for s in g.sets.values())
+
+        n = len(self.groups[0])
+        if any(len(group) != n for group in self.groups):
+            raise ValueError('The vectorized engine needs every kind to have the same number of things')
+
+        self.places = {}
+        for (k, group) in enumerate(self.groups):
+            for (i, t) in enumerate(group):
+                self.places[t] = (k, i)
+
+        self.perms = np.array(list(itertools.permutations(range(n))), dtype=np.intp).reshape(-1, n)
+        self.inverses = np.argsort(self.perms, axis=1)
+
+        # Things sort alphabetically by id, so give each id a code
+        # in sorted order that works across kinds
+        ids = sorted(set(t.id for t in g.things()))
+        code = {id: i for (i, id) in enumerate(ids)}
+        self.codes = list(np.array([code[t.id] for t in group]) for group in self.groups)
+
+        self.values = {}
+        self.checks = list(self.compile_rule(r) for clue in g.clues for r in clue.rules)
+
+    def count_worlds(self: VectorGame) -> int:
+        return len(self.perms) ** (len(self.groups) - 1)
+
+    def get_batch(self: VectorGame, start: int, stop: int) -> Batch:
+        """
+        Return worlds start to stop. The kinds after the first are the digits
+        of the world number in base n!, the second kind being the most significant.
+        """
+        worlds = np.arange(start, stop)
+        n = len(self.groups[0])
+        base = len(self.perms)
+
+        positions = [np.broadcast_to(np.arange(n), (len(worlds), n))]
+        rows = [positions[0]]
+        for k in range(1, len(self.groups)):
+            digit = (worlds // base ** (len(self.groups) - 1 - k)) % base
+            positions.append(self.perms[digit])
+            rows.append(self.inverses[digit])
+
+        return (positions, rows)
+
+    def realize(self: VectorGame, batch: Batch, w: int) -> list[list[Thing]]:
+        positions, _ = batch
+        n = len(self.groups[0])
+        return list(list(group[positions[k][w, r]] for (k, group) in enumerate(self.groups)) for r in range(n))
+
+    def filter_batch(self: VectorGame, batch: Batch) -> np.ndarray:
+        """Return the indices of the worlds in the batch that satisfy every rule."""
+        survivors = np.arange(len(batch[0][0]))
+
+        for check in self.checks:
+            if not len(survivors):
+                break
+            positions, rows = batch
+            subset = (list(p[survivors] for p in positions), list(r[survivors] for r in rows))
+            survivors = survivors[check(subset)]
+
+        return survivors
+
+    def resolve(self: VectorGame, s: Symbol) -> Callable[[Batch], Resolved]:
+        k, i = self.places[s.thing]
+
+        if not s.path:
+            def _resolve(batch: Batch) -> Resolved:
+                positions, rows = batch
+                row = rows[k][:, i]
+                return (k, np.full(len(row), i), row)
+            return _resolve
+
+        last = s.path[-1]
+
+        def _resolve(batch: Batch) -> Resolved:
+            positions, rows = batch
+            # Every Thing in a chain shares the row of the first one
+            row = rows[k][:, i]
+            return (last, positions[last][np.arange(len(row)), row], row)
+
+        return _resolve
+
+    def compile_rule(self: VectorGame, r: Rule) -> Check:
+        f = r.json['func']
+        negate = f.startswith('!') and f != '!'
+        base = f[1:] if negate else f
+
+        if f in {'or', 'and', 'xor', 'nand', 'nor', 'not', '!'}:
+            subchecks = list(self.compile_rule(sub) for sub in r.subrules)
+            return self.compile_meta(f, subchecks)
+
+        resolvers = list(self.resolve(s) for s in r.symbols)
+
+        match base:
+            case 'link':
+                test = self.link
+            case 'same':
+                test = self.same
+            case '<' | '>' | '<=' | '>=' | '<A' | '>A' | '<=A' | '>=A':
+                test = self.compile_sort(base)
+            case 'adj' | 'adj<' | 'adj>' | 'adjA' | 'adj<A' | 'adj>A':
+                test = self.compile_adjacent(base)
+            case '+' | '-' | '*' | '/':
+                test = self.compile_math(base, float(r.json['args'][0]))
+            case _:
+                raise ValueError(f'Unknown function: {f}')
+
+        if base == 'same' and negate:
+            # !same is "more than one distinct thing", which for a single argument is False
+            def check(batch: Batch) -> np.ndarray:
+                resolved = list(res(batch) for res in resolvers)
+                return ~test(resolved) & (len(resolved) > 1)
+            return check
+
+        def check(batch: Batch) -> np.ndarray:
+            result = test(list(res(batch) for res in resolvers))
+            return ~result if negate else result
+
+        return check
+
+    def compile_meta(self: VectorGame, f: str, subchecks: list[Check]) -> Check:
+        def _count(batch: Batch) -> np.ndarray:
+            count = np.zeros(len(batch[0][0]), dtype=np.intp)
+            for check in subchecks:
+                count += check(batch)
+            return count
+
+        match f:
+            case 'and':
+                return lambda batch: _count(batch) == len(subchecks)
+            case 'or':
+                return lambda batch: _count(batch) > 0
+            case 'xor':
+                return lambda batch: _count(batch) == 1
+            case 'nand':
+                return lambda batch: _count(batch) < len(subchecks)
+            case 'nor' | 'not' | '!':
+                return lambda batch: _count(batch) == 0
+
+        raise ValueError(f'Unknown function: {f}')
+
+    @staticmethod
+    def link(resolved: list[Resolved]) -> np.ndarray:
+        """Any two of the Things are linked, i.e. share a row."""
+        result = np.zeros(len(resolved[0][2]), dtype=bool)
+        for (a, b) in itertools.combinations(resolved, 2):
+            result |= a[2] == b[2]
+        return result
+
+    @staticmethod
+    def same(resolved: list[Resolved]) -> np.ndarray:
+        """All the Things are the same Thing: the same kind and position."""
+        k0, first, _ = resolved[0]
+        result = np.ones(len(first), dtype=bool)
+        for (k, position, _) in resolved[1:]:
+            result &= (position == first) if k == k0 else False
+        return result
+
+    def get_numerical_values(self: VectorGame, k: int) -> np.ndarray:
+        # Computed on first use, since a kind's ids need not be numeric
+        if k not in self.values:
+            self.values[k] = np.array([t.get_numerical_value() for t in self.groups[k]])
+        return self.values[k]
+
+    def compile_sort(self: VectorGame, f: str) -> Callable[[list[Resolved]], np.ndarray]:
+        alpha = f.endswith('A')
+        op = {
+            '<': np.less, '>': np.greater, '<=': np.less_equal, '>=': np.greater_equal
+        }[f.rstrip('A')]
+
+        def _values(k: int, position: np.ndarray) -> np.ndarray:
+            table = self.codes[k] if alpha else self.get_numerical_values(k)
+            return table[position]
+
+        def test(resolved: list[Resolved]) -> np.ndarray:
+            values = list(_values(k, position) for (k, position, _) in resolved)
+            result = np.ones(len(values[0]), dtype=bool)
+            for (a, b) in zip(values, values[1:]):
+                result &= op(a, b)
+            return result
+
+        return test
+
+    def compile_adjacent(self: VectorGame, f: str) -> Callable[[list[Resolved]], np.ndarray]:
+        alpha = f.endswith('A')
+        direction = f.removesuffix('A')[3:]
+
+        def _key(t: Thing) -> int|str:
+            return t.get_alphabetical_value() if alpha else t.get_numerical_value()
+
+        ranks = {}
+
+        def _ranks(k0: int, k: int) -> np.ndarray:
+            """The index of each Thing of kind k in the sorted values of kind k0."""
+            if (k0, k) not in ranks:
+                ordered = sorted(_key(t) for t in self.groups[k0])
+                ranks[(k0, k)] = np.array([ordered.index(_key(t)) for t in self.groups[k]])
+            return ranks[(k0, k)]
+
+        def test(resolved: list[Resolved]) -> np.ndarray:
+            k0 = resolved[0][0]
+            indices = list(_ranks(k0, k)[position] for (k, position, _) in resolved)
+            result = np.ones(len(indices[0]), dtype=bool)
+            for (a, b) in zip(indices, indices[1:]):
+                match direction:
+                    case '':
+                        result &= np.abs(a - b) <= 1
+                    case '<':
+                        result &= (b - a) == 1
+                    case '>':
+                        result &= (a - b) == 1
+            return result
+
+        return test
+
+    def compile_math(self: VectorGame, f: str, expected: float) -> Callable[[list[Resolved]], np.ndarray]:
+        def test(resolved: list[Resolved]) -> np.ndarray:
+            values = list(self.get_numerical_values(k)[position].astype(float) for (k, position, _) in resolved)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                match f:
+                    case '+':
+                        result = sum(values)
+                    case '*':
+                        result = math.prod(values)
+                    case '-':
+                        result = values[0] - sum(values[1:])
+                    case '/':
+                        result = values[0]
+                        for v in values[1:]:
+                            result = result / v
+            return np.abs(result - expected) < ThingMath.epsilon
+
+        return test
+
+def iter_solutions(g: Game, batch_size: int = 4096) -> Iterator[list[list[Thing]]]:
+    vg = VectorGame(g)
+
+    for start in range(0, vg.count_worlds(), batch_size):
+        batch = vg.get_batch(start, min(start + batch_size, vg.count_worlds()))
+        for w in vg.filter_batch(batch):
+            yield vg.realize(batch, w)
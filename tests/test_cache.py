@@ -0,0 +1,44 @@
+from __future__ import annotations
+from game import Game
+from cache import SolutionCache
+import solve
+
+def get_ids(solutions) -> list:
+    return sorted(list(list(t.id for t in row) for row in world) for world in solutions)
+
+def test_put_get_kinds_of_different_sizes(tmp_path) -> None:
+    # Sorted by name, the bigger kind A would come first in the file
+    data = {
+        'kinds': [
+            {'name': 'P', 'things': ['Al', 'Bo']},
+            {'name': 'A', 'things': ['1', '2', '3']},
+            {'name': 'C', 'things': ['red', 'blue']},
+        ],
+        'clues': [[{'func': 'link', 'args': ['Al', 'red']}]],
+    }
+    g = Game.parse_data(data)
+    solutions = solve.find_solutions(g, engine='backtrack', progress=False)
+
+    cache = SolutionCache(tmp_path)
+    with cache.put(g, solutions) as stored:
+        assert get_ids(stored) == get_ids(solutions)
+
+    with cache.get(Game.parse_data(data)) as cached:
+        assert len(cached) == len(solutions) == 6
+        assert get_ids(cached) == get_ids(solutions)
+
+def test_reordered_game_hits(tmp_path) -> None:
+    data = {
+        'kinds': [
+            {'name': 'P', 'things': ['Al', 'Bo']},
+            {'name': 'C', 'things': ['red', 'blue']},
+        ],
+        'clues': [[{'func': 'link', 'args': ['Al', 'red']}]],
+    }
+    g = Game.parse_data(data)
+    cache = SolutionCache(tmp_path)
+    cache.put(g, solve.find_solutions(g, engine='backtrack', progress=False)).close()
+
+    reordered = {'kinds': data['kinds'][::-1], 'clues': data['clues']}
+    with cache.get(Game.parse_data(reordered)) as cached:
+        assert get_ids(cached) == [[['red', 'Al'], ['blue', 'Bo']]]
@@ -0,0 +1,42 @@
+from __future__ import annotations
+import copy
+import json
+from pathlib import Path
+import pytest
+from game import Game
+import edits
+import snapshot
+import solve
+
+VALENTINE = Path(__file__).parent.parent / 'src' / 'games' / 'valentine.json'
+
+def get_ids(solutions) -> list[list[list[str]]]:
+    return sorted(list(list(t.id for t in row) for row in world) for world in solutions)
+
+def prepare(data: dict[str, object]) -> Game:
+    g = Game.parse_data(copy.deepcopy(data))
+    snapshot.prepare(g)
+    return g
+
+@pytest.mark.parametrize('engine', ['backtrack', 'parallel'])
+def test_resolve_matches_solving_again(engine: str) -> None:
+    data = json.loads(VALENTINE.read_text())
+    for i in range(len(data['clues'])):
+        edited = {'kinds': data['kinds'], 'clues': data['clues'][:i] + data['clues'][i + 1:]}
+
+        # Removing a clue, and adding it back
+        for (old, new) in ((data, edited), (edited, data)):
+            previous, g = prepare(old), prepare(new)
+            found = solve.find_solutions(previous, engine='backtrack', progress=False)
+            found = list(list(list(g.keys[t.id] for t in row) for row in world) for world in found)
+
+            # Exactly the solutions, each once
+            resolved = get_ids(edits.resolve(g, previous, found, engine, progress=False))
+            assert resolved == get_ids(solve.find_solutions(prepare(new), engine='backtrack', progress=False)), i
+
+def test_diff_keeps_adjacency_order() -> None:
+    data = json.loads(VALENTINE.read_text())
+    chain = {'kinds': data['kinds'], 'clues': [[{'func': 'adjA', 'args': ['Anne::Theater', 'Bruce::Theater', 'Carl::Theater']}]]}
+    swapped = {'kinds': data['kinds'], 'clues': [[{'func': 'adjA', 'args': ['Anne::Theater', 'Carl::Theater', 'Bruce::Theater']}]]}
+    (added, removed) = edits.get_diff(Game.parse_data(chain), Game.parse_data(swapped))
+    assert len(added) == len(removed) == 1
@@ -0,0 +1,63 @@
+from __future__ import annotations
+import asyncio
+import json
+from pathlib import Path
+from game import Game
+from service import Service, request
+import snapshot
+import solve
+
+VALENTINE = Path(__file__).parent.parent / 'src' / 'games' / 'valentine.json'
+
+# No solutions, but brute force only finds that out after (7!)^4 worlds
+ENDLESS = {
+    'kinds': list({'name': f'K{i}', 'things': list(f'{i}{j}' for j in range(7))} for i in range(5)),
+    'clues': [[{'func': '<', 'args': ['00::K1', '00::K1']}]],
+}
+
+def test_solves_like_find_solutions() -> None:
+    data = json.loads(VALENTINE.read_text())
+    g = Game.parse_data(data)
+    snapshot.prepare(g)
+    expected = sorted(list(list(t.id for t in row) for row in world) for world in solve.find_solutions(g, progress=False))
+
+    async def _run() -> list[dict[str, object]]:
+        service = Service(processes=1)
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return list([event async for event in request(data, 'backtrack', port=port)])
+        finally:
+            await service.close()
+
+    events = asyncio.run(_run())
+    assert events[0]['event'] == 'accepted'
+    assert events[-1]['event'] == 'done'
+    assert sorted(e['solution'] for e in events if e['event'] == 'solution') == expected
+    assert events[-1]['count'] == len(expected)
+
+def test_refuses_when_full() -> None:
+    async def _run() -> tuple[list[dict[str, object]], Service]:
+        # One job running and one waiting fill it
+        service = Service(processes=1, queue=1)
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+
+        first, answers = [], []
+        try:
+            # Requests with different limits are different jobs
+            for limit in (None, 1, 2):
+                answers.append(request(ENDLESS, 'brute', limit, port=port))
+                first.append(await anext(answers[-1]))
+        finally:
+            await service.close()
+            for answer in answers:
+                await answer.aclose()
+        return first, service
+
+    (first, service) = asyncio.run(_run())
+    assert list(e['event'] for e in first) == ['accepted', 'accepted', 'error']
+    assert 'full' in first[2]['error']
+    # Closing cancelled the running job, killing its worker process
+    assert not service.jobs
+    assert all(worker.done() for worker in service.workers)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+from typing import Callable
+import pytest
+from game import Game
+from thing import Thing, ThingMath, ThingSort
+
+def test_index_is_required() -> None:
+    with pytest.raises(TypeError):
+        Thing('Anne', 'Girl')
+
+def test_identity_is_the_index() -> None:
+    (a, b) = (Thing('Anne', 'Girl', 0), Thing('Bruce', 'Person', 1))
+    assert a != b
+    assert len({a, b, Thing('Anne', 'Girl', 0)}) == 2
+
+def make_kind(kind: str, ids: list[str], start: int = 0) -> list[Thing]:
+    things = list(Thing(id, kind, start + i) for (i, id) in enumerate(ids))
+    for t in things:
+        t.fellows = things
+    for t in things:
+        t.rank_fellows()
+    return things
+
+@pytest.mark.parametrize('check', [
+    ThingSort.are_ascending,
+    ThingSort.are_descending_or_equal,
+    ThingSort.are_adjacent,
+    lambda ts: ThingMath.sum_is(3, ts),
+    lambda ts: ThingMath.quotient_is(3, ts),
+])
+def test_non_numerical_things_raise_value_error(check: Callable[[list[Thing]], bool]) -> None:
+    (ann, bob) = make_kind('Person', ['Ann', 'Bob'])
+    (ten, _) = make_kind('Age', ['10', '20'], 2)
+    with pytest.raises(ValueError, match="'Ann' has no numerical value"):
+        check([ten, ann])
+    with pytest.raises(ValueError, match="'Ann' has no numerical value"):
+        check([ann, bob])
+
+def test_compiled_sort_raises_value_error() -> None:
+    data = {
+        'kinds': [{'name': 'Person', 'things': ['Ann', 'Bob']}, {'name': 'Pet', 'things': ['cat', 'dog']}],
+        'clues': [[{'func': '<', 'args': ['Ann::Pet', 'Bob::Pet']}]],
+    }
+    g = Game.parse_data(data)
+    for t in g.sets['Person']:
+        t.relate(g.keys['cat'] if t.id == 'Ann' else g.keys['dog'])
+    with pytest.raises(ValueError, match="'cat' has no numerical value"):
+        g.validate_all_clues()
+    g.compile_clues()
+    with pytest.raises(ValueError, match="'cat' has no numerical value"):
+        g.validate_all_clues()